@@ -8,6 +8,9 @@ import re
 import random
 import csv
 import GPTLCD
+import evaluation
+import logging
+import asyncio
 from typing import List, Set, Union
 
 
@@ -15,10 +18,18 @@ from typing import List, Set, Union
 datasets = ["amazon", "dblp"]
 dataset = datasets[0]
 filename = "../dataset/"+dataset+"/"+dataset+".txt"
-G = GPTLCD.read_bigdataset(filename)
-##计算F1
 truthfile = "../dataset/"+dataset+"/realdata.txt"
-list_true = GPTLCD.read_truthbigdataset(truthfile)
+snapshotfile = "../dataset/"+dataset+"/"+dataset+".snap" #由snapshot.py生成的二进制快照
+csr = True #使用CSR格式存储图，内存占用远小于字典
+if os.path.exists(snapshotfile):
+    G, list_true = GPTLCD.load_snapshot(snapshotfile) #内存映射加载，无需解析文本
+else:
+    if csr:
+        G = GPTLCD.read_bigdataset_csr(filename)
+    else:
+        G = GPTLCD.read_bigdataset(filename)
+    ##计算F1
+    list_true = GPTLCD.read_truthbigdataset(truthfile)
 
 
 
@@ -27,6 +38,8 @@ G_neighbors={}
 G_neighborslist_1 = []
 
 alllist = []
+if isinstance(G, GPTLCD.CSRGraph):
+    alllist = G.fromlabels(alllist) #快照中的图重新编号时，种子节点转换为稠密编号（真实社区已在快照中转换）
 
 
 sum = 0
@@ -38,20 +51,70 @@ iteration = 2
 HaveSK = True
 WithoutSK = False
 promptselector = 5 #1-zeroshot 2-fewshot 3-cot 4-bag 5-nsg
+K = 5 #潜在节点的数量
+#GPTLCD.setbackend(GPTLCD.HTTPBackend("http://127.0.0.1:8000/v1")) #离线测试时使用本地替身服务器llmserver.py
+processes = 0 #大于0时使用多进程扩展种子（存在快照时各进程共享内存映射的图）
+GPTLCD.setratelimit(GPTLCD.MODEL, rpm=500, tpm=60000, shared=processes > 0) #按账号的访问限制设置每分钟请求数和token数，多进程时各进程共享
+GPTLCD.setrequestretry(8, deadline=600) #单个请求遇到限流错误最多重试8次、最多用时600秒，之后报错而不是无限等待
+GPTLCD.setresponsecache("responses_"+dataset+".db") #缓存GPT回复，重新运行时不再重复请求已回答的提示
+GPTLCD.setstructured(False) #为True时GPT在回答末尾输出JSON，本地解析出节点，省去第二次提取节点的请求
+GPTLCD.sethybrid(None) #设为0到1之间的阈值时，Delta M第一名明显占优的步骤不请求GPT，直接选择第一名
+GPTLCD.setbatch(1) #大于1时每次节点选择让GPT按可能性给出至多B个节点，依次加入直到M值不再增大
+GPTLCD.setneighborhood(fanout=None, total=None) #限制每个节点展开的邻居数和每一阶邻域的节点数，枢纽节点较多的大图上可以设置
+logging.basicConfig(level=logging.INFO) #改为logging.DEBUG时输出发送给GPT的完整提示和GPT的回复
+tracer = GPTLCD.settrace("trace_"+dataset+".jsonl") #按阶段记录耗时、请求次数、token用量和社区大小
+GPTLCD.setbudget(seedtokens=None, seeddollars=None, runtokens=None, rundollars=None) #每个种子和整个运行的token、费用上限
+GPTLCD.setretrylimit(3, timeout=120) #每次节点选择最多重试3次、最多用时120秒，之后回退为Delta M最大的潜在节点
 
+concurrency = 8 #同时扩展的种子数，1表示依次扩展
+parallel = True #同时进行每个种子的各次迭代
+targetM = None #某次迭代的社区M值达到该值后取消其余迭代，None表示执行全部迭代
+cover = None #覆盖模式，"skip"跳过已在发现社区中的种子，"warm"以该社区为起点继续扩展；对全图检测时令alllist = list(G.keys())
+
+config = GPTLCD.runconfig(ns1,iteration,K,HaveSK,promptselector,targetM=targetM,cover=cover) #配置改变后不再跳过旧配置下完成的种子
+journal = GPTLCD.RunJournal("run_"+dataset+".jsonl", G, list_true, config) #每个种子完成后立即写入结果，中断后重新运行时跳过同一配置下已完成的种子
+pending = journal.pending(alllist)
+print("已完成" + str(len(alllist) - len(pending)) + "个种子，剩余" + str(len(pending)) + "个")
+
+seedstats = {seed: record["stats"] for seed, record in journal.records.items()} #每个种子节点选择的次数、重试、回退和跳过GPT的次数
+communities = journal.communities() #种子节点 -> 预测社区
+if cover is not None:
+    coverlist, found = GPTLCD.coverseeds(alllist,G,ns1,iteration,K,HaveSK,promptselector,cover,
+                                         parallel=parallel,targetM=targetM,stats=seedstats,journal=journal)
+    communities.update(found)
+    print("覆盖中的社区数:" + str(len(coverlist)))
+elif processes > 0:
+    for seed, seed_list, scores, seedstats[seed], trail in GPTLCD.runseedspool(pending,G,list_true,ns1,iteration,K,HaveSK,promptselector,processes,
+                                                       snapshotfile if os.path.exists(snapshotfile) else None,
+                                                       targetM=targetM):
+        communities[seed] = seed_list
+        journal.record(seed, seed_list, trail, seedstats[seed], scores)
+elif concurrency > 1:
+    communities.update(asyncio.run(GPTLCD.arunseeds(pending,G,ns1,iteration,K,HaveSK,promptselector,concurrency,
+                                                     parallel=parallel,targetM=targetM,stats=seedstats,journal=journal)))
+stopped = False #运行预算用完后不再扩展，未完成的种子不计分也不写入日志，增大预算后重新运行即可继续
 for seed in alllist:
-    seed_list = GPTLCD.gpt_communityexpansion(seed,G,ns1,iteration,HaveSK,promptselector)
-
-
-    realcommunity = []
-    count = 0
-    for j in range(len(list_true)):
-        if seed in list_true[j]:
-            set1 = set(realcommunity)
-            set2 = set(list_true[j])
-            union_set = set1 | set2
-            realcommunity = list(union_set)
-            count = count + 1
+    if seed in communities:
+        seed_list = communities[seed]
+    elif stopped:
+        continue
+    else:
+        trail = []
+        try:
+            seed_list = GPTLCD.gpt_communityexpansion(seed,G,ns1,iteration,K,HaveSK,promptselector,
+                                                      parallel=parallel,targetM=targetM,stats=seedstats.setdefault(seed, {}),trail=trail)
+        except GPTLCD.RunBudgetExceeded:
+            stopped = True
+            continue
+        communities[seed] = seed_list
+        journal.record(seed, seed_list, trail, seedstats[seed])
+
+
+    realcommunity = list_true.union(seed) #包含种子的全部真实社区的并集，由倒排索引直接得到
+    if not realcommunity:
+        print("种子" + str(seed) + "不在任何真实社区中，不计算指标，当前结果" + str(seed_list))
+        continue
+    count = len(list_true.containing(seed))
     a, b, c, d = GPTLCD.eval_scores(seed_list, realcommunity)
     # print(count)
     # print("GPT-LCD:",seed_list)
@@ -59,3 +122,18 @@ for seed in alllist:
     sum = sum + c
     length = length + 1
     print("当前结果" + str(seed_list) + " F1:" + str(c) + " Jaccard:" + str(d))
+
+unfinished = [seed for seed in alllist if seed not in communities]
+if unfinished:
+    print("运行预算已用完，" + str(len(unfinished)) + "个种子未完成，不计入结果")
+runstats = {}
+for seed in communities: #只统计有结果的种子
+    for key, n in seedstats.get(seed, {}).items():
+        runstats[key] = runstats.get(key, 0) + n
+print("本次运行的节点选择统计:" + str(runstats))
+print(evaluation.table(evaluation.evaluate(communities, list_true, len(G)))) #全部种子的平均指标、平均F1和ONMI
+for stage, metrics in tracer.metrics().items():
+    print(stage + ":" + str(metrics))
+tracer.close()
+GPTLCD.responsecache.close()
+journal.close()
@@ -8,6 +8,8 @@ import re
 import random
 import csv
 import GPTLCD
+import evaluation
+import logging
 from typing import List, Set, Union
 
 
@@ -40,18 +42,65 @@ iteration = 2 #迭代次数
 HaveSK = True #有SK的图编码
 WithoutSK = False #无SK的图编码
 promptselector = 5 #1-zeroshot 2-fewshot 3-cot 4-bag 5-nsg
+K = 5 #潜在节点的数量
+parallel = True #同时进行各次迭代
+targetM = None #某次迭代的社区M值达到该值后取消其余迭代，None表示执行全部迭代
+#GPTLCD.setbackend(GPTLCD.HTTPBackend("http://127.0.0.1:8000/v1")) #离线测试时使用本地替身服务器llmserver.py
+GPTLCD.setratelimit(GPTLCD.MODEL, rpm=500, tpm=60000) #按账号的访问限制设置每分钟请求数和token数
+GPTLCD.setrequestretry(8, deadline=600) #单个请求遇到限流错误最多重试8次、最多用时600秒，之后报错而不是无限等待
+GPTLCD.setresponsecache("responses_"+dataset+".db") #缓存GPT回复，重新运行时不再重复请求已回答的提示
+GPTLCD.setstructured(False) #为True时GPT在回答末尾输出JSON，本地解析出节点，省去第二次提取节点的请求
+GPTLCD.sethybrid(None) #设为0到1之间的阈值时，Delta M第一名明显占优的步骤不请求GPT，直接选择第一名
+GPTLCD.setbatch(1) #大于1时每次节点选择让GPT按可能性给出至多B个节点，依次加入直到M值不再增大
+GPTLCD.setneighborhood(fanout=None, total=None) #限制每个节点展开的邻居数和每一阶邻域的节点数，枢纽节点较多的大图上可以设置
+logging.basicConfig(level=logging.INFO) #改为logging.DEBUG时输出发送给GPT的完整提示和GPT的回复
+tracer = GPTLCD.settrace("trace_"+dataset+".jsonl") #按阶段记录耗时、请求次数、token用量和社区大小
+GPTLCD.setbudget(seedtokens=None, seeddollars=None, runtokens=None, rundollars=None) #每个种子和整个运行的token、费用上限
+GPTLCD.setretrylimit(3, timeout=120) #每次节点选择最多重试3次、最多用时120秒，之后回退为Delta M最大的潜在节点
 
 
 alllist = [1]
 
 
+config = GPTLCD.runconfig(ns1,iteration,K,HaveSK,promptselector,targetM=targetM) #配置改变后不再跳过旧配置下完成的种子
+journal = GPTLCD.RunJournal("run_"+dataset+".jsonl", G, list_true, config) #每个种子完成后立即写入结果，中断后重新运行时跳过同一配置下已完成的种子
+runstats = {} #节点选择的次数、重试、回退和跳过GPT的次数，包括之前运行中已完成的种子
+communities = journal.communities() #种子节点 -> 预测社区
+stopped = False #运行预算用完后不再扩展，未完成的种子不计分也不写入日志，增大预算后重新运行即可继续
 for seed in alllist:
-    seed_list = GPTLCD.gpt_communityexpansion(seed,G,ns1,iteration,HaveSK,promptselector)
-    for j in range(len(list_true)):
-        flag = j
-        if seed in list_true[j]:
-            break
-    a, b, c, d = GPTLCD.eval_scores(seed_list, list_true[flag])
+    if seed in journal:
+        seed_list = communities[seed]
+        seedstats = journal.records[seed]["stats"]
+    elif stopped:
+        continue
+    else:
+        seedstats = {}
+        trail = []
+        try:
+            seed_list = GPTLCD.gpt_communityexpansion(seed,G,ns1,iteration,K,HaveSK,promptselector,
+                                                      parallel=parallel,targetM=targetM,stats=seedstats,trail=trail)
+        except GPTLCD.RunBudgetExceeded:
+            stopped = True
+            continue
+        communities[seed] = seed_list
+        journal.record(seed, seed_list, trail, seedstats)
+    for key, n in seedstats.items():
+        runstats[key] = runstats.get(key, 0) + n
+    flag = list_true.containing(seed) #包含种子的真实社区
+    if not flag:
+        print("种子" + str(seed) + "不在任何真实社区中，不计算指标，当前结果" + str(seed_list))
+        continue
+    a, b, c, d = GPTLCD.eval_scores(seed_list, list_true[flag[0]]) #第一个包含种子的真实社区
 
     print("当前结果" + str(seed_list) +" F1:" + str(c)+" Jaccard:"+str(d))
 
+unfinished = [seed for seed in alllist if seed not in communities]
+if unfinished:
+    print("运行预算已用完，" + str(len(unfinished)) + "个种子未完成，不计入结果")
+print("本次运行的节点选择统计:" + str(runstats))
+print(evaluation.table(evaluation.evaluate(communities, list_true, len(G)))) #全部种子的平均指标、平均F1和ONMI
+for stage, metrics in tracer.metrics().items():
+    print(stage + ":" + str(metrics))
+tracer.close()
+GPTLCD.responsecache.close()
+journal.close()
@@ -2,9 +2,13 @@
 
 import multiprocessing
 import math
+import array
+import bisect
+import mmap
 import copy
 import time
 import os
+import sys
 import openai
 import re
 import random
@@ -12,6 +16,18 @@ import csv
 import time
 import requests
 import json
+import hashlib
+import sqlite3
+import asyncio
+import threading
+import contextvars
+import logging
+import contextlib
+import functools
+import heapq
+import cProfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Set, Union
 import tiktoken
 
@@ -48,7 +64,7 @@ def read_csv(file_path):
     file_path (str): CSV文件的路径，文件中每一行表示一个节点或社区的分布。
 
     返回值:
-    list: 一个列表，列表中的每个元素都是一个子列表，表示每个社区中的节点编号。
+    GroundTruth: 真实社区列表，每个元素都是一个子列表，表示每个社区中的节点编号。
     """
     list_true = []
     with open(file_path, mode='r', encoding='utf-8') as file:
@@ -59,30 +75,19 @@ def read_csv(file_path):
     for i in range(int((len(list_true) + 1) / 2)):
         list_true_son = [int(x) for x in list_true[i * 2]]
         list_truecomm.append(list_true_son)
-    return list_truecomm
+    return GroundTruth(list_truecomm)
 
 def read_bigdataset(filename):
     """
-    读取数据集（如 Amazon 或 DBLP），以构建全局无向图。
+    读取数据集（如 Amazon 或 DBLP），以构建全局无向图。边文件由read_edges批量解析，重复边和自环被去除。
 
     参数:
-    filename (str): 文件路径，文件中的每一行表示两个节点之间的边，节点由空格分隔的整数表示。
+    filename (str): 文件路径，文件中的每一行表示两个节点之间的边，节点由空格或制表符分隔的整数表示，以#或%开头的行为注释。
 
     返回值:
-    dict: 一个表示图的字典，键是节点的标识符（整数），值是相邻节点（整数）列表。
+    dict: 一个表示图的字典，键是节点的标识符（整数），值是升序排列的相邻节点（整数）列表。
     """
-
-    graph = {}
-    with open(filename, 'r') as file:
-        for line in file:
-            node1, node2 = map(int, line.strip().split())
-            if node1 not in graph:
-                graph[node1] = []
-            if node2 not in graph:
-                graph[node2] = []
-            graph[node1].append(node2)
-            graph[node2].append(node1)  # 因为是无向图，所以两个节点都要互相连接
-    return graph
+    return CSRGraph.from_array(read_edges(filename), relabel=True).todict()  # 重新编号使内存与节点数而不是最大编号成正比
 
 def read_truthbigdataset(filename):
     """
@@ -92,26 +97,554 @@ def read_truthbigdataset(filename):
     filename (str): 文件路径，文件中的每一行表示一个由节点组成的序列，节点由空格分隔的整数表示。
 
     返回值:
-    list: 一个列表，列表中的每个元素都是一个子列表，表示一个节点序列（例如，社区或簇）。
+    GroundTruth: 真实社区列表，每个元素都是一个子列表，表示一个节点序列（例如，社区或簇）。
     """
     sequences = []
     with open(filename, 'r') as file:
         for line in file:
             sequence = list(map(int, line.strip().split()))  # 去除每行两端的空白字符，然后按空格分割，并转换为整数列表
             sequences.append(sequence)
-    return sequences
+    return GroundTruth(sequences)
+
+class GroundTruth(list):
+    """
+    真实社区列表，附带节点到社区编号的倒排索引。仍然是一个社区列表，可以像原来的list_true一样按下标访问和遍历；
+    查找包含某个节点的社区是常数时间，与真实社区的数量无关。创建后不应再修改列表。
+
+    参数:
+    communities (iterable): 真实社区，每个元素是一个节点列表。
+    """
+
+    def __init__(self, communities=()):
+        super().__init__(communities)
+        self.index = {}  # 节点 -> 包含该节点的社区编号列表
+        for i, community in enumerate(self):
+            for node in community:
+                ids = self.index.setdefault(node, [])
+                if not ids or ids[-1] != i:
+                    ids.append(i)
+        self._unions = {}
+
+    def containing(self, node):
+        """
+        返回值:
+        list: 包含node的社区编号，按社区在列表中的顺序排列；node不在任何社区中时为空列表。
+        """
+        return self.index.get(node, [])
+
+    def union(self, node):
+        """
+        包含node的全部真实社区的并集，结果会被缓存。
+
+        返回值:
+        frozenset: 节点集合，node不在任何社区中时为空集合。
+        """
+        result = self._unions.get(node)
+        if result is None:
+            result = frozenset(x for i in self.containing(node) for x in self[i])
+            self._unions[node] = result
+        return result
+
+class CSRNeighbors:
+    """
+    CSRGraph中一个节点的邻居视图，行为与邻居列表一致（可迭代、可索引），成员判断使用二分查找。
+    """
+    __slots__ = ("_array", "_lo", "_hi")
+
+    def __init__(self, array_, lo, hi):
+        self._array = array_
+        self._lo = lo
+        self._hi = hi
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __iter__(self):
+        return iter(self._array[self._lo:self._hi])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index = index + len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("neighbor index out of range")
+        return self._array[self._lo + index]
+
+    def __contains__(self, node):
+        pos = bisect.bisect_left(self._array, node, self._lo, self._hi)
+        return pos < self._hi and self._array[pos] == node
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+class CSRGraph:
+    """
+    以CSR（压缩稀疏行）格式存储的无向图，可以替代read/read_bigdataset返回的字典。
+    邻居存放在一个连续的有序整数数组中，已去除重复边和自环；节点是否存在用位图记录。
+    G[node]、node in G、G.keys()、G.items()的用法与字典相同，因此可直接传给getneighbors1、computeM、getlocalgraph、getjudgegrpah等函数。
+
+    参数:
+    offsets (array): 长度为n+1的偏移数组，节点v的邻居为neighbors[offsets[v]:offsets[v+1]]。
+    neighbors (array): 各节点邻居依次拼接而成的数组，每段内部升序排列。
+    present (bytearray): 节点存在位图，第v位为1表示节点v在图中。
+    labels (array): 可选，稠密编号到原始节点编号的映射；为None表示未重新编号。
+    """
+
+    def __init__(self, offsets, neighbors, present, labels=None):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.present = present
+        self.labels = labels
+
+    @classmethod
+    def from_edges(cls, edges, nodes=None, relabel=False):
+        """
+        由边序列构建CSR图，去除自环和重复边。
+
+        参数:
+        edges (iterable): 边序列，每个元素为(node1, node2)。
+        nodes (iterable): 可选，需要包含在图中的节点（如孤立节点）。
+        relabel (bool): 是否将节点重新编号为0..n-1，原始编号保存在labels中。
+
+        返回值:
+        CSRGraph: 构建好的CSR图。
+        """
+        src = array.array('q')
+        dst = array.array('q')
+        nodeset = set(nodes) if nodes is not None else set()
+        for node1, node2 in edges:
+            nodeset.add(node1)
+            nodeset.add(node2)
+            if node1 != node2:
+                src.append(node1)
+                dst.append(node2)
+        labels = None
+        if relabel:
+            labels = array.array('q', sorted(nodeset))
+            index = {node: i for i, node in enumerate(labels)}
+            src = array.array('q', (index[node] for node in src))
+            dst = array.array('q', (index[node] for node in dst))
+            nodeset = range(len(labels))
+            del index
+        n = max(nodeset) + 1 if nodeset else 0
+        # 按源节点计数排序（两个方向各一次）
+        counts = array.array('q', [0]) * (n + 1)
+        for node in src:
+            counts[node + 1] += 1
+        for node in dst:
+            counts[node + 1] += 1
+        for v in range(n):
+            counts[v + 1] += counts[v]
+        cursor = array.array('q', counts)
+        neighbors = array.array('q', [0]) * len(src) * 2
+        for node1, node2 in zip(src, dst):
+            neighbors[cursor[node1]] = node2
+            cursor[node1] += 1
+            neighbors[cursor[node2]] = node1
+            cursor[node2] += 1
+        del src, dst, cursor
+        # 每段排序去重并就地压缩
+        offsets = array.array('q', [0]) * (n + 1)
+        pos = 0
+        for v in range(n):
+            segment = sorted(set(neighbors[counts[v]:counts[v + 1]]))
+            neighbors[pos:pos + len(segment)] = array.array('q', segment)
+            pos = pos + len(segment)
+            offsets[v + 1] = pos
+        del neighbors[pos:]
+        present = bytearray((n + 7) // 8)
+        for node in nodeset:
+            present[node >> 3] |= 1 << (node & 7)
+        return cls(offsets, neighbors, present, labels)
+
+    @classmethod
+    def from_array(cls, edges, nodes=None, relabel=False):
+        """
+        与from_edges相同，但输入为NumPy边数组，排序、去重和计数全部向量化完成，适合数百万条边的图。
+
+        参数:
+        edges (numpy.ndarray): 形状为(m, 2)的整数边数组，如read_edges的返回值。
+        nodes (iterable): 可选，需要包含在图中的节点（如孤立节点）。
+        relabel (bool): 是否将节点重新编号为0..n-1，原始编号保存在labels中。
+
+        返回值:
+        CSRGraph: 构建好的CSR图。
+        """
+        import numpy as np
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        m = len(edges)
+        allnodes = np.concatenate([edges[:, 0], edges[:, 1], np.fromiter(nodes if nodes is not None else (), dtype=np.int64)])
+        labels = None
+        if relabel:
+            top = int(allnodes.max()) + 1 if len(allnodes) else 0
+            if len(allnodes) and allnodes.min() >= 0 and top <= 2 * len(allnodes):  # 编号较稠密时按位图求名次，不排序
+                mask = np.zeros(top, dtype=bool)
+                mask[allnodes] = True
+                labelarray = np.flatnonzero(mask)
+                allnodes = (np.cumsum(mask) - 1)[allnodes]
+            else:
+                labelarray, allnodes = np.unique(allnodes, return_inverse=True)
+            labels = array.array('q', labelarray.tobytes())
+            n = len(labelarray)
+        else:
+            n = int(allnodes.max()) + 1 if len(allnodes) else 0
+        src, dst = allnodes[:m], allnodes[m:2 * m]
+        loop = src == dst
+        lo = np.minimum(src, dst)[~loop]
+        hi = np.maximum(src, dst)[~loop]
+        if n < 3037000499:  # n*n不超过int64时用一个整数键排序去重
+            key = lo * n + hi
+            key.sort()
+            key = np.concatenate([key[:1], key[1:][key[1:] != key[:-1]]])
+            lo, hi = key // n, key % n
+            key = np.concatenate([lo * n + hi, hi * n + lo])
+            key.sort()
+            rows, cols = key // n, key % n
+        else:
+            pairs = np.unique(np.stack([lo, hi], axis=1), axis=0)
+            rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+            cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+            order = np.lexsort((cols, rows))
+            rows, cols = rows[order], cols[order]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+        mask = np.zeros(n, dtype=bool)
+        mask[allnodes] = True
+        present = bytearray(np.packbits(mask, bitorder='little').tobytes())
+        return cls(array.array('q', offsets.tobytes()), array.array('q', cols.tobytes()), present, labels)
+
+    @classmethod
+    def from_dict(cls, G, relabel=False):
+        """
+        由字典形式的图构建CSR图。
+
+        参数:
+        G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+        relabel (bool): 是否将节点重新编号为0..n-1。
+
+        返回值:
+        CSRGraph: 构建好的CSR图。
+        """
+        edges = ((node, nodee) for node, nodelist in G.items() for nodee in nodelist if node <= nodee)
+        return cls.from_edges(edges, G.keys(), relabel)
+
+    def __contains__(self, node):
+        return 0 <= node < len(self.offsets) - 1 and (self.present[node >> 3] >> (node & 7)) & 1 == 1
+
+    def __getitem__(self, node):
+        if node not in self:
+            raise KeyError(node)
+        return CSRNeighbors(self.neighbors, self.offsets[node], self.offsets[node + 1])
+
+    def __iter__(self):
+        for node in range(len(self.offsets) - 1):
+            if (self.present[node >> 3] >> (node & 7)) & 1:
+                yield node
+
+    def __len__(self):
+        return int.from_bytes(self.present, 'little').bit_count()
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for node in self:
+            yield node, self[node]
+
+    def todict(self):
+        """
+        返回值:
+        dict: 与read_bigdataset格式相同的字典形式的图，键为节点，值为升序排列的邻居列表；重新编号过的图使用原始编号。
+        """
+        offsets = self.offsets.tolist()
+        if self.labels is None:
+            neighbors = self.neighbors.tolist()
+            return {node: neighbors[offsets[node]:offsets[node + 1]] for node in self}
+        import numpy as np
+        labels = np.frombuffer(self.labels, dtype=np.int64)  # labels升序，原始编号的邻居列表仍然有序
+        neighbors = labels[np.frombuffer(self.neighbors, dtype=np.int64)].tolist()
+        labels = labels.tolist()
+        return {labels[node]: neighbors[offsets[node]:offsets[node + 1]] for node in self}
+
+    def degree(self, node):
+        """
+        返回值:
+        int: 节点的度（去重后的邻居数）。
+        """
+        if node not in self:
+            raise KeyError(node)
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def has_edge(self, node1, node2):
+        """
+        使用二分查找判断两个节点是否相邻。
+
+        返回值:
+        bool: node1与node2之间是否有边。
+        """
+        return node1 in self and node2 in self[node1]
+
+    def number_of_edges(self):
+        """
+        返回值:
+        int: 图中无向边的数量。
+        """
+        return len(self.neighbors) // 2
+
+    def nbytes(self):
+        """
+        返回值:
+        int: 偏移数组、邻居数组、位图和编号映射占用的字节数。
+        """
+        size = len(self.offsets) * 8 + len(self.neighbors) * 8 + len(self.present)
+        if self.labels is not None:
+            size = size + len(self.labels) * 8
+        return size
+
+    def tolabels(self, nodes):
+        """
+        将稠密编号转换为原始节点编号。
+
+        参数:
+        nodes (list): 稠密编号的节点列表。
+
+        返回值:
+        list: 原始编号的节点列表；未重新编号时原样返回。
+        """
+        if self.labels is None:
+            return list(nodes)
+        return [self.labels[node] for node in nodes]
+
+    def fromlabels(self, nodes):
+        """
+        将原始节点编号转换为稠密编号，使用二分查找。
+
+        参数:
+        nodes (list): 原始编号的节点列表。
+
+        返回值:
+        list: 稠密编号的节点列表；未重新编号时原样返回。
+        """
+        if self.labels is None:
+            return list(nodes)
+        result = []
+        for node in nodes:
+            pos = bisect.bisect_left(self.labels, node)
+            if pos == len(self.labels) or self.labels[pos] != node:
+                raise KeyError(node)
+            result.append(pos)
+        return result
+
+EDGECHUNK = 1 << 26  # read_edges每次读取的字节数
+
+def _stripcomments(data):
+    # 删除从#或%到行尾的内容。只在注释符出现的位置切分，不逐行扫描，注释通常只在文件头
+    pieces = []
+    pos = 0
+    while True:
+        hits = [hit for hit in (data.find(b"#", pos), data.find(b"%", pos)) if hit >= 0]
+        if not hits:
+            break
+        hit = min(hits)
+        end = data.find(b"\n", hit)
+        pieces.append(data[pos:hit])
+        pos = len(data) if end < 0 else end
+    pieces.append(data[pos:])
+    return b"".join(pieces)
+
+def read_edges(filename, chunksize=EDGECHUNK):
+    """
+    按块批量解析边文件：每次读取chunksize字节，在最后一个换行处切开，整块交给NumPy转换为整数，
+    不再逐行split和int，速度比逐行解析快一个数量级以上。
+
+    #或%到行尾的内容视为注释（如SNAP数据集的文件头），分隔符可以是空格、制表符或逗号，行尾可以是\r\n；
+    每行只取前两列，其余列（如边权重或时间戳）被忽略，此时按浮点数解析，节点编号不超过2**53时结果精确。
+    所有非空行的列数必须与第一个非空行相同，否则抛出ValueError并给出行号。
+
+    参数:
+    filename (str): 边文件路径。
+    chunksize (int): 每块的字节数。
 
-def getneighbors1(seed_list,G):
+    返回值:
+    numpy.ndarray: 形状为(m, 2)的int64边数组，保留文件中的顺序、重复边和自环，由CSRGraph.from_array去除。
+    """
+    import numpy as np
+    whitespace = np.zeros(256, dtype=bool)
+    whitespace[list(b" \t\n\r\v\f")] = True
+    parts = []
+    columns = None
+    lines = 0  # 之前各块的行数，用于报告出错的行号
+    rest = b""
+    with open(filename, 'rb') as file:
+        while True:
+            chunk = file.read(chunksize)
+            data = rest + chunk
+            if chunk:
+                end = data.rfind(b"\n") + 1
+                data, rest = data[:end], data[end:]
+            if b"#" in data or b"%" in data:
+                data = _stripcomments(data)
+            if b"," in data:
+                data = data.replace(b",", b" ")
+            # 按字节找出每个字段的起始位置，再按换行位置统计每行的字段数（注释删除后换行仍保留，行号不变）
+            buffer = np.frombuffer(data, dtype=np.uint8)
+            text = ~whitespace[buffer]
+            starts = np.flatnonzero(text[1:] & ~text[:-1]) + 1
+            if len(text) and text[0]:
+                starts = np.concatenate([[0], starts])
+            newlines = np.flatnonzero(buffer == 10)
+            if len(starts):
+                counts = np.bincount(np.searchsorted(newlines, starts))
+                if columns is None:
+                    columns = int(counts[counts > 0][0])
+                bad = np.flatnonzero((counts != 0) & (counts != columns))
+                if len(bad):
+                    raise ValueError(filename + ": line " + str(lines + int(bad[0]) + 1) + " has " + str(int(counts[bad[0]]))
+                                     + " columns, expected " + str(columns))
+                try:
+                    values = np.fromstring(data, dtype=np.int64 if columns == 2 else np.float64, sep=" ")
+                except ValueError:
+                    values = None
+                if values is None or len(values) != len(starts):
+                    raise ValueError(filename + ": could not parse every value as a number")
+                parts.append(values.reshape(-1, columns)[:, :2].astype(np.int64))
+            lines = lines + len(newlines)
+            if not chunk:
+                break
+    if columns is not None and columns < 2:
+        raise ValueError(filename + ": an edge line needs two nodes")
+    return np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int64)
+
+def read_csr(file1,file2,relabel=False):
+    """
+    与read相同，读取节点文件和边文件，但返回CSR格式的图。
+
+    参数:
+    file1 (str): 包含节点列表的文件路径。
+    file2 (str): 包含边列表的文件路径。
+    relabel (bool): 是否将节点重新编号为0..n-1。
+
+    返回值:
+    CSRGraph: CSR格式的图。
+    """
+    with open(file1) as f:
+        nodes = [int(line) for line in f if line.strip()]
+    return CSRGraph.from_array(read_edges(file2), nodes, relabel)
+
+def read_bigdataset_csr(filename,relabel=False):
+    """
+    与read_bigdataset相同，读取大规模数据集的边文件，但返回CSR格式的图，内存占用远小于字典形式。
+
+    参数:
+    filename (str): 文件路径，文件中的每一行表示两个节点之间的边。
+    relabel (bool): 是否将节点重新编号为0..n-1；节点编号稀疏时建议开启。
+
+    返回值:
+    CSRGraph: CSR格式的图。
+    """
+    return CSRGraph.from_array(read_edges(filename), None, relabel)
+
+SNAPSHOT_MAGIC = b"GPTLCDG1"
+
+def _writesection(file, data):
+    file.write(data)
+    pad = (-len(data)) % 8
+    if pad:
+        file.write(bytes(pad))
+
+def save_snapshot(filename,G,list_true=None):
+    """
+    将图（及可选的真实社区）写入二进制快照文件，之后可用load_snapshot通过内存映射快速加载。
+
+    文件格式：8字节魔数，8个int64组成的文件头（是否重新编号、各数组长度），
+    随后依次为offsets、neighbors、节点位图、labels、真实社区偏移数组和真实社区节点数组，每段按8字节对齐。
+
+    参数:
+    filename (str): 快照文件路径。
+    G (dict 或 CSRGraph): 图结构，字典形式会先转换为CSRGraph。
+    list_true (list): 可选，真实社区列表，如read_truthbigdataset的返回值，使用原始节点编号。
+                      图已重新编号时转换为稠密编号后保存，使其与图一致；不在图中的节点被去掉。
+    """
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.from_dict(G)
+    if G.labels is not None and list_true:
+        index = {node: i for i, node in enumerate(G.labels)}
+        list_true = [[index[node] for node in community if node in index] for community in list_true]
+    offsets = array.array('q', G.offsets)
+    neighbors = array.array('q', G.neighbors)
+    labels = array.array('q', G.labels if G.labels is not None else [])
+    comm_offsets = array.array('q', [0])
+    comm_nodes = array.array('q')
+    for community in (list_true or []):
+        comm_nodes.extend(community)
+        comm_offsets.append(len(comm_nodes))
+    header = array.array('q', [int(G.labels is not None), len(offsets), len(neighbors), len(G.present),
+                               len(labels), len(comm_offsets), len(comm_nodes), 0])
+    if sys.byteorder != "little":
+        for data in (header, offsets, neighbors, labels, comm_offsets, comm_nodes):
+            data.byteswap()
+    with open(filename, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        for data in (header, offsets, neighbors):
+            _writesection(file, data.tobytes())
+        _writesection(file, bytes(G.present))
+        for data in (labels, comm_offsets, comm_nodes):
+            _writesection(file, data.tobytes())
+
+def load_snapshot(filename):
+    """
+    通过内存映射加载save_snapshot写出的快照，不解析文本，只建立数组视图，因此耗时与图的规模基本无关。
+    多个进程加载同一文件时共享操作系统页缓存中的同一份数据。
+
+    参数:
+    filename (str): 快照文件路径。
+
+    返回值:
+    tuple: (CSRGraph, GroundTruth)，图结构（数组为只读的内存映射视图）和真实社区列表（快照中没有真实社区时为空列表）。
+           图已重新编号时真实社区同样使用稠密编号，原始编号可由G.tolabels得到。
+    """
+    if sys.byteorder != "little":
+        raise ValueError("snapshot files are little-endian")
+    with open(filename, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mm)
+    if bytes(buf[:8]) != SNAPSHOT_MAGIC:
+        raise ValueError(filename + " is not a graph snapshot")
+    header = buf[8:72].cast('q')
+    relabel, n_offsets, n_neighbors, n_present, n_labels, n_comm, n_commnodes = header[:7]
+    pos = 72
+    sections = []
+    for size, fmt in ((n_offsets, 'q'), (n_neighbors, 'q'), (n_present, 'B'), (n_labels, 'q'),
+                      (n_comm, 'q'), (n_commnodes, 'q')):
+        nbytes = size * (8 if fmt == 'q' else 1)
+        sections.append(buf[pos:pos + nbytes].cast(fmt))
+        pos = pos + nbytes + (-nbytes) % 8
+    offsets, neighbors, present, labels, comm_offsets, comm_nodes = sections
+    G = CSRGraph(offsets, neighbors, present, labels if relabel else None)
+    list_true = GroundTruth(list(comm_nodes[comm_offsets[i]:comm_offsets[i + 1]]) for i in range(len(comm_offsets) - 1))
+    return G, list_true
+
+def getneighbors1(seed_list,G,state=None):
     """
     输入当前社区和图结构，获取当前社区的一阶邻居节点列表。
 
     参数:
     seed_list (list): 当前社区中的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    state (CommunityState): 可选的增量社区状态，提供时直接读取其维护的一阶邻居。
 
     返回值:
-    list: 当前社区的一阶邻居节点列表，不包含当前社区中的节点。
+    list: 当前社区的一阶邻居节点列表，不包含当前社区中的节点。设置了邻域策略（setneighborhood）时为策略选出的部分邻居。
     """
+    if NEIGHBORHOOD is not None:
+        return NEIGHBORHOOD.neighbors1(seed_list, G, state)
+    if state is not None:
+        state.sync(seed_list)
+        return state.getneighbors1()
     G_neighborslist_1 = []
     temp = []
     for seed in seed_list:
@@ -119,21 +652,26 @@ def getneighbors1(seed_list,G):
         for son in temp:
             G_neighborslist_1.append(son)
     G_neighborslist_1 = set(G_neighborslist_1)
-    G_neighborslist_1 = [x for x in G_neighborslist_1 if x not in seed_list]
+    community = set(seed_list)
+    G_neighborslist_1 = [x for x in G_neighborslist_1 if x not in community]
     return G_neighborslist_1
 
-def getneighbors2(seed_list,G):
+def getneighbors2(seed_list,G,state=None,neighbors1=None):
     """
     输入当前社区和图结构，获取当前社区的二阶邻居节点列表。
 
     参数:
     seed_list (list): 当前社区中的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    state (CommunityState): 可选的增量社区状态。
+    neighbors1 (list): 可选，已经求出的一阶邻居，提供时不再重新计算。
 
     返回值:
-    list: 当前社区的二阶邻居节点列表，不包含当前社区中的节点。
+    list: 当前社区的二阶邻居节点列表，不包含当前社区中的节点。设置了邻域策略（setneighborhood）时为策略选出的部分邻居。
     """
-    G_neighborslist_1 = getneighbors1(seed_list,G)
+    G_neighborslist_1 = getneighbors1(seed_list,G,state) if neighbors1 is None else neighbors1
+    if NEIGHBORHOOD is not None:
+        return NEIGHBORHOOD.neighbors2(seed_list, G, G_neighborslist_1)
     G_neighborslist_2 = []
     temp = []
     for node in G_neighborslist_1:
@@ -141,9 +679,142 @@ def getneighbors2(seed_list,G):
         for son in temp:
             G_neighborslist_2.append(son)
     G_neighborslist_2 = set(G_neighborslist_2)
-    G_neighborslist_2 = [x for x in G_neighborslist_2 if x not in seed_list]
+    community = set(seed_list)
+    G_neighborslist_2 = [x for x in G_neighborslist_2 if x not in community]
     return G_neighborslist_2
 
+def inducedsubgraph(nodes,G):
+    """
+    获取由给定节点导出的子图的邻接表。成员判断使用哈希表，耗时与这些节点的度数之和成正比，
+    不再与节点数的平方成正比，二阶邻域很大时（如DBLP中合作者众多的作者）也能快速完成。
+
+    参数:
+    nodes (list): 子图的节点，可以有重复，只保留第一次出现。
+    G (dict 或 CSRGraph): 图结构。
+
+    返回值:
+    dict: 子图的邻接表，节点按在nodes中第一次出现的顺序排列，邻居保持在G中的顺序，只包含nodes之间的边。
+    """
+    G_local = {int(node): None for node in nodes}
+    for node in G_local:
+        G_local[node] = [nodee for nodee in G[node] if nodee in G_local]
+    return G_local
+
+class NeighborhoodPolicy:
+    """
+    度感知的邻域采样策略。幂律图中枢纽节点的一阶、二阶邻域可达数万个节点，其中绝大多数与社区无关，
+    该策略限制参与潜在节点打分（getneighbors1）和图编码（getneighbors2、getjudgegrpah）的邻域大小，使每一步的代价有上界。
+
+    邻域中的节点按连向上一阶（社区或一阶邻居）的边数排序，即共同邻居数，图中有重复边时相当于边权重；
+    分数相同的节点按由seed和当前社区决定的随机顺序排列，因此同一社区总是得到相同的邻域，运行结果可以复现。
+
+    参数:
+    fanout (int): 每个节点最多展开的邻居数，只保留其中分数最高的fanout个，None表示不限。
+    total (int): 每一阶邻域最多保留的节点数，None表示不限。
+    seed (int): 打破平局的随机数种子。
+    """
+
+    def __init__(self, fanout=None, total=None, seed=0):
+        self.fanout = fanout
+        self.total = total
+        self.seed = seed
+
+    def key(self, scores, seed_list):
+        """
+        返回值:
+        function: 节点的排序键，分数高的节点在前，分数相同时按由seed和当前社区决定的可复现的随机顺序排列。
+        """
+        rng = random.Random(str(self.seed) + ":" + ",".join(str(node) for node in sorted(set(seed_list))))
+        ties = {node: rng.random() for node in sorted(scores)}
+        return lambda node: (-scores[node], ties[node])
+
+    def rank(self, scores, seed_list, cap=None):
+        """
+        参数:
+        scores (dict): 节点 -> 分数。
+        seed_list (list): 当前社区的节点列表，用于确定平局的顺序。
+        cap (int): 可选，只返回排名最前的cap个节点。
+
+        返回值:
+        list: scores中的节点，按分数从高到低排列，分数相同时按可复现的随机顺序排列。
+        """
+        return self.top(scores, self.key(scores, seed_list), cap)
+
+    @staticmethod
+    def top(nodes, key, cap=None):
+        """
+        返回值:
+        list: nodes中按key排名最前的cap个节点。cap小于节点数时用堆选出，不对整个邻域排序。
+        """
+        if cap is None or cap >= len(nodes):
+            return sorted(nodes, key=key)
+        return heapq.nsmallest(cap, nodes, key=key)
+
+    def expand(self, sources, G, exclude, seed_list, scores=None):
+        """
+        从sources出发选择不在exclude中的邻居。
+
+        参数:
+        sources (list): 被展开的节点。
+        G (dict 或 CSRGraph): 图结构。
+        exclude (set): 不选择的节点（当前社区）。
+        seed_list (list): 当前社区的节点列表，用于确定平局的顺序。
+        scores (dict): 可选，已知的节点 -> 连向sources的边数，如CommunityState.kin。
+
+        返回值:
+        list: 选出的邻居，按分数从高到低排列。
+        """
+        if scores is None:
+            scores = {}
+            for node in sources:
+                for nodee in G[node]:
+                    if nodee not in exclude:
+                        scores[nodee] = scores.get(nodee, 0) + 1
+        if self.fanout is None:
+            return self.rank(scores, seed_list, self.total)
+        key = self.key(scores, seed_list)
+        keep = set()
+        for node in sources:
+            outside = {nodee for nodee in G[node] if nodee in scores}
+            keep.update(heapq.nsmallest(self.fanout, outside, key=key))
+        return self.top(keep, key, self.total)
+
+    def neighbors1(self, seed_list, G, state=None):
+        """
+        返回值:
+        list: 策略选出的当前社区的一阶邻居。
+        """
+        scores = None
+        if state is not None:
+            state.sync(seed_list)
+            scores = state.kin
+        return self.expand(seed_list, G, set(seed_list), seed_list, scores)
+
+    def neighbors2(self, seed_list, G, neighbors1):
+        """
+        返回值:
+        list: 从策略选出的一阶邻居neighbors1出发，策略选出的二阶邻居（与getneighbors2相同，可能包含一阶邻居）。
+        """
+        return self.expand(neighbors1, G, set(seed_list), seed_list)
+
+NEIGHBORHOOD = None  # 邻域采样策略，None表示使用完整的一阶、二阶邻域，见setneighborhood
+
+def setneighborhood(fanout=None, total=None, seed=0):
+    """
+    设置潜在节点打分和图编码使用的邻域采样策略，见NeighborhoodPolicy。
+
+    参数:
+    fanout (int): 每个节点最多展开的邻居数，None表示不限。
+    total (int): 每一阶邻域最多保留的节点数，None表示不限。
+    seed (int): 打破平局的随机数种子。
+
+    返回值:
+    NeighborhoodPolicy: 设置后的策略，fanout和total都为None时为None，即不限制邻域。
+    """
+    global NEIGHBORHOOD
+    NEIGHBORHOOD = None if fanout is None and total is None else NeighborhoodPolicy(fanout, total, seed)
+    return NEIGHBORHOOD
+
 def computeM(community_list,G):
     """
     输入当前社区和图结构，计算当前社区的M值。
@@ -173,6 +844,109 @@ def computeM(community_list,G):
         M = M*len(community_set)/len(community_list)
         return M
 
+class CommunityState:
+    """
+    增量维护的社区状态。记录社区节点集合、内部边数e_in、外部边数e_out以及每个一阶邻居连向社区的边数，
+    节点加入社区时以O(deg(v))的代价更新，任意候选节点加入后的M值可在常数时间内得到，结果与computeM一致。
+
+    参数:
+    G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    seed_list (list): 初始社区的节点列表，可以为空。
+    """
+
+    def __init__(self, G, seed_list=None):
+        self.G = G
+        self.nodes = []  # 社区节点列表，与seed_list保持一致（可能包含重复节点）
+        self.members = set()  # 社区节点集合
+        self.ein = 0  # 内部边的端点数，即内部边数的两倍
+        self.eout = 0  # 连向社区外部的边数
+        self.kin = {}  # 一阶邻居节点 -> 该节点连向社区的边数
+        self._degrees = {}  # 节点 -> (度, 自环端点数)
+        if seed_list:
+            self.sync(seed_list)
+
+    def _degree(self, node):
+        if node not in self._degrees:
+            nodelist = self.G[node]
+            loops = sum(1 for nodee in nodelist if nodee == node)
+            self._degrees[node] = (len(nodelist), loops)
+        return self._degrees[node]
+
+    def add(self, node):
+        """
+        将节点加入社区并更新各项计数，代价为O(deg(node))。
+
+        参数:
+        node (int): 加入社区的节点。
+        """
+        self.nodes.append(node)
+        if node in self.members:
+            return
+        kin = self.kin.pop(node, 0)
+        degree, loops = self._degree(node)
+        self.members.add(node)
+        self.ein = self.ein + 2 * kin + loops
+        self.eout = self.eout - kin + (degree - kin - loops)
+        for nodee in self.G[node]:
+            if nodee not in self.members:
+                self.kin[nodee] = self.kin.get(nodee, 0) + 1
+
+    def sync(self, seed_list):
+        """
+        使状态与社区节点列表保持一致。seed_list在原列表末尾追加节点时只处理新增节点，否则重新构建状态。
+
+        参数:
+        seed_list (list): 当前社区的节点列表。
+        """
+        n = len(self.nodes)
+        if len(seed_list) < n or seed_list[:n] != self.nodes:
+            self.nodes, self.members, self.ein, self.eout, self.kin = [], set(), 0, 0, {}
+            n = 0
+        for node in seed_list[n:]:
+            self.add(node)
+
+    def getneighbors1(self):
+        """
+        返回值:
+        list: 当前社区的一阶邻居节点列表，不包含当前社区中的节点。
+        """
+        return list(self.kin)
+
+    def computeM(self):
+        """
+        返回值:
+        float: 当前社区的M值，与computeM(seed_list, G)相同。
+        """
+        if self.eout == 0:
+            return -1
+        M = (self.ein / 2) / self.eout
+        M = M * len(self.members) / len(self.nodes)
+        return M
+
+    def computeM_add(self, node):
+        """
+        计算节点加入社区后的M值，不修改社区状态。
+
+        参数:
+        node (int): 待加入的节点。
+
+        返回值:
+        float: 节点加入后的M值，与computeM(seed_list + [node], G)相同。
+        """
+        if node in self.members:
+            ein, eout, size = self.ein, self.eout, len(self.members)
+        else:
+            kin = self.kin.get(node, 0)
+            degree, loops = self._degree(node)
+            ein = self.ein + 2 * kin + loops
+            eout = self.eout - kin + (degree - kin - loops)
+            size = len(self.members) + 1
+        if eout == 0:
+            return -1
+        M = (ein / 2) / eout
+        M = M * size / (len(self.nodes) + 1)
+        return M
+
 def getcandidate(d,length):
     """
     输入保存M值的字典和参数k，获得M值最大的k个节点。
@@ -187,7 +961,7 @@ def getcandidate(d,length):
     sorted_dict = sorted(d.items(), key=lambda x: x[1], reverse=True)
     return [item[0] for item in sorted_dict[:length]]
 
-def StorageM(G_neighborslist_1,community_list,G):
+def StorageM(G_neighborslist_1,community_list,G,state=None):
     """
     输入当前社区、一阶邻居节点列表和图结构，获取当前社区邻居节点中M值增量（DeltaM）大于0的节点。
 
@@ -195,11 +969,20 @@ def StorageM(G_neighborslist_1,community_list,G):
     G_neighborslist_1 (list): 当前社区的一阶邻居节点列表。
     community_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    state (CommunityState): 可选的增量社区状态，提供时以常数时间计算每个节点加入后的M值。
 
     返回值:
     dict: 一个字典，包含M值增量（DeltaM）大于0的节点，键为节点，值为该节点加入社区后的新M值。
     """
     mdict = {}
+    if state is not None:
+        state.sync(community_list)
+        M1 = state.computeM()
+        for node in G_neighborslist_1:
+            M2 = state.computeM_add(node)
+            if M2 - M1 > 0:#threshold
+                mdict.update({node: M2})
+        return mdict
     M1 = computeM(community_list,G)
     for node in G_neighborslist_1:
         Mtemp = copy.deepcopy(community_list)
@@ -210,7 +993,7 @@ def StorageM(G_neighborslist_1,community_list,G):
             mdict.update({node: M2})
     return mdict
 
-def StorageM2(G_neighborslist_1,community_list,G):
+def StorageM2(G_neighborslist_1,community_list,G,state=None):
     """
     输入当前社区、一阶邻居节点列表和图结构，获取当前社区每一个邻居节点加入后的M值。
 
@@ -218,11 +1001,17 @@ def StorageM2(G_neighborslist_1,community_list,G):
     G_neighborslist_1 (list): 当前社区的一阶邻居节点列表。
     community_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    state (CommunityState): 可选的增量社区状态，提供时以常数时间计算每个节点加入后的M值。
 
     返回值:
     dict: 一个字典，包含每个邻居节点在加入社区后的M值，键为邻居节点，值为该节点加入社区后的新M值。
     """
     mdict = {}
+    if state is not None:
+        state.sync(community_list)
+        for node in G_neighborslist_1:
+            mdict.update({node: state.computeM_add(node)})
+        return mdict
     M1 = computeM(community_list,G)
     for node in G_neighborslist_1:
         Mtemp = copy.deepcopy(community_list)
@@ -258,7 +1047,187 @@ def getGneighbors(seedlist,N,G):
             G_neighbors[node].append(nodee)
     return G_neighbors
 
-def evalcandidate_m(seed_list,G,K):
+logger = logging.getLogger("GPTLCD")  # 发送给GPT的完整提示和回复以DEBUG级别输出
+
+class Tracer:
+    """
+    记录扩展流程各阶段的耗时和计数。每条记录作为一行JSON写入path（JSONL），同时在内存中按阶段汇总。
+    记录由tracespan和traced产生，包括GPT请求的token用量、限流等待、重试次数以及每一步的社区大小。
+    多个进程可以追加写入同一个文件（每条记录带有pid），但汇总只包含当前进程的记录。
+
+    参数:
+    path (str): 可选，JSONL文件路径，None表示只在内存中汇总。
+    """
+
+    SUMMED = ("retries", "fallback", "cached", "throttle", "prompt_tokens", "completion_tokens")  # 汇总时累加的字段
+
+    def __init__(self, path=None):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8") if path is not None else None
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, **fields):
+        """
+        记录一次阶段的执行。
+
+        参数:
+        stage (str): 阶段名称。
+        seconds (float): 耗时（秒）。
+        fields: 其他字段，其中SUMMED中的字段会按阶段累加。
+        """
+        line = {"time": time.time(), "pid": os.getpid(), "stage": stage, "seconds": seconds}
+        line.update(fields)
+        with self._lock:
+            total = self.totals.setdefault(stage, {"count": 0, "seconds": 0.0})
+            total["count"] = total["count"] + 1
+            total["seconds"] = total["seconds"] + seconds
+            for key in self.SUMMED:
+                if key in fields:
+                    total[key] = total.get(key, 0) + fields[key]
+            if self.file is not None:
+                self.file.write(json.dumps(line, default=str) + "\n")
+                self.file.flush()
+
+    def metrics(self):
+        """
+        返回值:
+        dict: 阶段名称 -> {"count": 次数, "seconds": 总耗时, 以及SUMMED中各字段的累加值}。
+        """
+        with self._lock:
+            return {stage: dict(total) for stage, total in self.totals.items()}
+
+    def close(self):
+        """
+        写入一条汇总记录并关闭文件。
+        """
+        if self.file is not None:
+            with self._lock:
+                self.file.write(json.dumps({"time": time.time(), "pid": os.getpid(), "stage": "summary",
+                                            "metrics": self.totals}) + "\n")
+                self.file.close()
+                self.file = None
+
+tracer = None  # 当前的Tracer，由settrace设置，None表示不记录
+
+def settrace(path=None, enabled=True):
+    """
+    开始记录各阶段的耗时和计数。之前的Tracer会被关闭。
+
+    参数:
+    path (str): 可选，JSONL文件路径。
+    enabled (bool): 为False时停止记录，不再创建新的Tracer。
+
+    返回值:
+    Tracer: 新的Tracer，调用其metrics()获取汇总，close()结束写入；停止记录时为None。
+    """
+    global tracer
+    if tracer is not None:
+        tracer.close()
+    tracer = Tracer(path) if enabled else None
+    return tracer
+
+@contextlib.contextmanager
+def tracespan(stage, **fields):
+    """
+    记录with块的耗时。块内可以向返回的字典中添加字段，结束时一并记录；没有设置Tracer时不记录。
+
+    参数:
+    stage (str): 阶段名称。
+    fields: 初始字段。
+    """
+    current = tracer
+    if current is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        current.record(stage, time.perf_counter() - start, **fields)
+
+_tracing = threading.local()
+
+def traced(stage):
+    """
+    记录函数耗时的装饰器。同一线程中同一阶段嵌套调用（例如经过StepCache的递归调用）只记录最外层一次。
+
+    参数:
+    stage (str): 阶段名称。
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active = _tracing.__dict__.setdefault("active", set())
+            if tracer is None or stage in active:
+                return function(*args, **kwargs)
+            active.add(stage)
+            try:
+                with tracespan(stage):
+                    return function(*args, **kwargs)
+            finally:
+                active.discard(stage)
+        return wrapper
+    return decorate
+
+@contextlib.contextmanager
+def profiling(filename):
+    """
+    用cProfile分析with块，结束时把统计写入filename，可用python -m pstats或snakeviz查看。
+
+    参数:
+    filename (str): 统计文件路径。
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+
+class StepCache:
+    """
+    单步计算结果的LRU缓存。以社区状态（节点集合、节点列表长度或节点顺序）和K为键，
+    缓存潜在节点、补充节点和局部子图，使一次llms调用内部以及同一种子多次迭代重走相同早期状态时只计算一次。
+    一个缓存只能用于同一个图G。
+
+    参数:
+    maxsize (int): 最多缓存的条目数，超出后淘汰最久未使用的条目。
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        读取缓存，未命中时调用compute计算并写入缓存。
+
+        参数:
+        key (tuple): 缓存键。
+        compute (callable): 无参数函数，返回需要缓存的结果。
+
+        返回值:
+        object: 缓存的结果，调用方不应修改。
+        """
+        with self._lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits = self.hits + 1
+                return self.data[key]
+            self.misses = self.misses + 1
+        value = compute()
+        with self._lock:
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return value
+
+def evalcandidate_m(seed_list,G,K,state=None):
     """
     输入当前社区、一阶邻居和参数K，获取Delta M大于0的前K个节点。
 
@@ -266,16 +1235,17 @@ def evalcandidate_m(seed_list,G,K):
     seed_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     K (int): 需要返回的节点数量，即Delta M大于0的前K个节点。
+    state (CommunityState): 可选的增量社区状态。
 
     返回值:
     list: 包含Delta M大于0的前K个节点的列表。
     """
-    G_neighborslist_1 = getneighbors1(seed_list, G)  # 社区一阶邻居
-    mdict = StorageM(G_neighborslist_1, seed_list,G)
+    G_neighborslist_1 = getneighbors1(seed_list, G, state)  # 社区一阶邻居
+    mdict = StorageM(G_neighborslist_1, seed_list,G,state)
     candidate = getcandidate(mdict,K)
     return candidate
 
-def Mpatch(seed_list,G,K):
+def Mpatch(seed_list,G,K,state=None,cache=None):
     """
     输入当前社区、一阶邻居和参数K，获取用于节点补充的节点。
 
@@ -283,16 +1253,22 @@ def Mpatch(seed_list,G,K):
     seed_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     K (int): 需要返回的节点数量，即前K个潜在补充的节点。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
 
     返回值:
     list: 获取用于节点补充的节点。
     """
-    G_neighborslist_1 = getneighbors1(seed_list, G)  # 社区一阶邻居
-    mdict = StorageM2(G_neighborslist_1, seed_list,G)
+    if cache is not None:
+        key = ("Mpatch", frozenset(seed_list), len(seed_list), K)
+        return list(cache.get(key, lambda: Mpatch(seed_list, G, K, state)))
+    G_neighborslist_1 = getneighbors1(seed_list, G, state)  # 社区一阶邻居
+    mdict = StorageM2(G_neighborslist_1, seed_list,G,state)
     candidate = getcandidate(mdict,K)
     return candidate
 
-def getevalcanidate(seed_list,G, K):
+@traced("getevalcanidate")
+def getevalcanidate(seed_list,G, K,state=None,cache=None):
     """
     输入当前社区、一阶邻居和参数K，获取节点选择的潜在节点。
 
@@ -300,15 +1276,44 @@ def getevalcanidate(seed_list,G, K):
     seed_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     K (int): 需要返回的节点数量，即前K个潜在补充的节点。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
 
     返回值:
     list: 包含潜在补充的前K个节点的列表。
     """
-    G_neighborslist_1 = getneighbors1(seed_list, G)  # 社区一阶邻居
-    candidate1 = evalcandidate_m(seed_list, G, K)
+    if cache is not None:
+        key = ("getevalcanidate", frozenset(seed_list), len(seed_list), K)
+        return list(cache.get(key, lambda: getevalcanidate(seed_list, G, K, state)))
+    candidate1 = evalcandidate_m(seed_list, G, K, state)
 
     return candidate1
 
+def deltagap(seed_list,G,state=None,cache=None):
+    """
+    输入当前社区，计算Delta M最大和第二大的潜在节点之间的相对差距，用于判断节点选择是否有明显的最优节点。
+
+    参数:
+    seed_list (list): 当前社区的节点列表。
+    G (dict): 图结构。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
+
+    返回值:
+    float: (DeltaM1 - DeltaM2) / DeltaM1，取值0到1，越大说明第一名越突出；只有一个潜在节点时为1，没有潜在节点时为0。
+    """
+    if cache is not None:
+        key = ("deltagap", frozenset(seed_list), len(seed_list))
+        return cache.get(key, lambda: deltagap(seed_list, G, state))
+    mdict = StorageM(getneighbors1(seed_list, G, state), seed_list, G, state)
+    if len(mdict) == 0:
+        return 0.0
+    M = state.computeM() if state is not None else computeM(seed_list, G)
+    top = sorted(mdict.values(), reverse=True)[:2]
+    if len(top) == 1:
+        return 1.0
+    return (top[0] - top[1]) / (top[0] - M)
+
 def communirytostr(seed_list):
     """
     输入当前社区的节点列表，将其转换为图结构的文本描述。
@@ -350,6 +1355,7 @@ def GraphtoStr2(G):
     #     Gstr = Gstr + strnum
 
     seed_list = list(G.keys())
+    nodeset = set(seed_list)
 
     for node in seed_list:
         if node == seed_list[-1]:
@@ -361,7 +1367,7 @@ def GraphtoStr2(G):
     for key,value in G.items():
         stredge = "Node "+str(key)+" is connected to nodes "
         for node in G[key]:
-            if node in seed_list:#只考虑一阶节点
+            if node in nodeset:#只考虑一阶节点
                 if node != G[key][-1]:
                     strnode = str(node) + ","
                 else:
@@ -371,7 +1377,7 @@ def GraphtoStr2(G):
         Gstr = Gstr + stredge
     return Gstr
 
-def getlocalgraph(seed_list,G,K):
+def getlocalgraph(seed_list,G,K,state=None,cache=None):
     """
     输入当前社区、图结构和参数K，获取当前社区和潜在节点的局部图邻接表。
 
@@ -379,23 +1385,22 @@ def getlocalgraph(seed_list,G,K):
     seed_list (list): 当前社区的节点列表。
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     K (int): 潜在节点的数量。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
 
     返回值:
     dict: 当前社区及其潜在节点构成的局部图的邻接表。
     """
-    candidate = getevalcanidate(seed_list,G,K)
-    localnode = seed_list+candidate
-    G_local = {}
-    for node in localnode:
-        nodedict = {int(node): []}
-        G_local.update(nodedict)
-    for node in localnode:
-        for nodee in G[node]:
-            if nodee in localnode:
-                G_local[node].append(nodee)
-    return G_local
+    candidate = getevalcanidate(seed_list,G,K,state,cache)
+
+    def build():
+        return inducedsubgraph(seed_list+candidate, G)
 
-def getjudgegrpah(seed_list,G,i,K):
+    if cache is not None:
+        return cache.get(("getlocalgraph", tuple(seed_list), K), build)
+    return build()
+
+def getjudgegrpah(seed_list,G,i,K,state=None,cache=None):
     """
     输入当前社区、图结构、分类符i和参数K，根据需求获取不同的邻接表。
 
@@ -404,57 +1409,33 @@ def getjudgegrpah(seed_list,G,i,K):
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     i (int): 分类符，用于确定获取邻接表的方式。
     K (int): 潜在节点的数量。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
 
     返回值:
     dict: 生成的邻接表，根据分类符i的不同而不同。
     """
-    if(i==1):#当前社区和潜在节点的邻接表
-        mpatch = Mpatch(seed_list, G,K)
-        localnode = seed_list + mpatch
-        G_local = {}  # 只有社区节点和补充节点
-        for node in localnode:
-            nodedict = {int(node): []}
-            G_local.update(nodedict)
-        for node in localnode:
-            for nodee in G[node]:
-                if nodee in localnode:
-                    G_local[node].append(nodee)
-        return G_local
-    if(i==2): # 当前社区及其一阶邻居的邻接表
-        G_local2 = {}
-        mpatch = Mpatch(seed_list, G,K)
-        localnode2 = seed_list + mpatch
-
-        for node in mpatch:
-            for nodee in G[node]:
-                if nodee not in localnode2:
-                    localnode2.append(nodee)
-        for node in localnode2:
-            nodedict2 = {int(node): []}
-            G_local2.update(nodedict2)
-        for node in localnode2:
-            for nodee in G[node]:
-                if nodee in localnode2:
-                    G_local2[node].append(nodee)
-        return G_local2
-    if(i==3):# 在i=2的基础上加入二阶邻居
-        G_neighborslist_1 = getneighbors1(seed_list, G)
-        G_neighbors2order = getneighbors2(seed_list, G)
-
-        G_local3 = {}  # 社区节点补充节点及其相关的一阶邻居
-        localnode3 = seed_list + G_neighborslist_1 + G_neighbors2order
-
-        for node in localnode3:
-            nodedict3 = {int(node): []}
-            G_local3.update(nodedict3)
-        for node in localnode3:
-            for nodee in G[node]:
-                if nodee in localnode3:
-                    G_local3[node].append(nodee)
-        return G_local3
-
-
-def Graphencoder(seed_list,G,i,K,SK):
+    if(i==1 or i==2):
+        mpatch = Mpatch(seed_list, G,K,state,cache)
+
+    def build():
+        if(i==1):#当前社区和潜在节点的邻接表
+            return inducedsubgraph(seed_list + mpatch, G)  # 只有社区节点和补充节点
+        if(i==2): # 当前社区及其一阶邻居的邻接表
+            localnode2 = seed_list + mpatch + [nodee for node in mpatch for nodee in G[node]]
+            return inducedsubgraph(localnode2, G)
+        if(i==3):# 在i=2的基础上加入二阶邻居
+            G_neighborslist_1 = getneighbors1(seed_list, G, state)
+            G_neighbors2order = getneighbors2(seed_list, G, state, G_neighborslist_1)  # 复用一阶邻居
+            return inducedsubgraph(seed_list + G_neighborslist_1 + G_neighbors2order, G)
+
+    if cache is not None:
+        return cache.get(("getjudgegrpah", tuple(seed_list), i, K), build)
+    return build()
+
+
+@traced("Graphencoder")
+def Graphencoder(seed_list,G,i,K,SK,state=None,cache=None,limit2=None,sklines=None):
     """
     输入当前社区、图结构、分类符i、参数K和判断是否具有补充知识SK。获取完整的图文本。
 
@@ -464,21 +1445,27 @@ def Graphencoder(seed_list,G,i,K,SK):
     i (int): 分类符，用于确定编码图的方式。
     K (int): 潜在节点的数量。
     SK (bool): 是否包含补充知识的标志。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
+    limit2 (int): 可选，节点补充（i=2）时最多保留的社区外节点数，按加入后的M值从高到低保留，补充节点始终保留。
+    sklines (int): 可选，补充知识中最多描述的节点数。
 
     返回值:
     str: 完整的图文本，根据分类符 `i` 和 `SK` 的不同而不同。
     """
     if(i==1): #节点选择的图编码
         #图拓扑
-        candidate = getevalcanidate(seed_list, G,K)
-        G_communitycandi = getlocalgraph(seed_list, G,K)
+        candidate = getevalcanidate(seed_list, G,K,state,cache)
+        G_communitycandi = getlocalgraph(seed_list, G,K,state,cache)
         Incident = GraphtoStr2(G_communitycandi)
 
         #补充知识
         connectstr = ""
-        for node in candidate:
+        for node in candidate[:sklines]:
             nodelist = G[node]
-            common = [element for element in seed_list if element in nodelist]
+            neighborset = set(nodelist)
+            common = [element for element in seed_list if element in neighborset]
+            commonset = set(common)
             nodestr = "Node " + str(node) + " is connected to nodes within the community: "
             for nodee in common:
                 if (nodee == common[-1]):
@@ -486,7 +1473,7 @@ def Graphencoder(seed_list,G,i,K,SK):
                     continue
                 nodestr = nodestr + str(nodee) + ","
             nodestr2 = "Node " + str(node) + " is connected to nodes outside community: "
-            out_list = [element for element in nodelist if element not in common]
+            out_list = [element for element in nodelist if element not in commonset]
             out_list = list(set(out_list) & set(candidate))
             if(out_list):
                 for nodee in out_list:
@@ -499,8 +1486,7 @@ def Graphencoder(seed_list,G,i,K,SK):
 
             connectstr = connectstr + nodestr + nodestr2
 
-        IncidentwithSK = GraphtoStr2(
-            G_communitycandi) + ". Supplementary knowledge: Nodes in the current community: " + str(
+        IncidentwithSK = Incident + ". Supplementary knowledge: Nodes in the current community: " + str(
             seed_list) + ". The outside nodes contain:" + str(candidate) + ". " + connectstr
 
         if(SK):
@@ -511,23 +1497,25 @@ def Graphencoder(seed_list,G,i,K,SK):
 
     if(i==2):#节点补充的图编码
         #图拓扑
-        #社区和待定及其一阶邻居
-        G_judge = getjudgegrpah(seed_list, G,2,K)#1:社区及其补充节点   2：1+一阶邻居   3：社区及其二阶邻居
-        graphtext_judge = GraphtoStr2(G_judge)
         #社区及其一二阶邻居
-        G_judge2 = getjudgegrpah(seed_list, G,3,K)
-        CN2 = G_judge2.keys()
-        N2 = []
-        for node in CN2:
-            if node not in seed_list:
-                N2.append(node)
+        G_judge2 = getjudgegrpah(seed_list, G,3,K,state,cache)#1:社区及其补充节点   2：1+一阶邻居   3：社区及其二阶邻居
+        community = set(seed_list)
+        N2 = [node for node in G_judge2 if node not in community]
 
         #补充知识
-        mpath = Mpatch(seed_list, G, K)
+        mpath = Mpatch(seed_list, G, K, state, cache)
+        if limit2 is not None and len(N2) > limit2:#按M值裁剪社区外节点以控制文本长度
+            mdict = StorageM2(N2, seed_list, G, state)
+            keep = set(mpath) | set(getcandidate(mdict, max(limit2 - len(mpath), 0)))
+            N2 = [node for node in N2 if node in keep]
+            keep.update(seed_list)
+            G_judge2 = {node: [nodee for nodee in nodelist if nodee in keep] for node, nodelist in G_judge2.items() if node in keep}
         connectstr = ""
-        for node in mpath:
+        for node in mpath[:sklines]:
             nodelist = G[node]
-            common = [element for element in seed_list if element in nodelist]
+            neighborset = set(nodelist)
+            common = [element for element in seed_list if element in neighborset]
+            commonset = set(common)
             nodestr = "Node "+str(node) + " is connected to nodes within the community: "
             for nodee in common:
                 if(nodee==common[-1]):
@@ -535,7 +1523,9 @@ def Graphencoder(seed_list,G,i,K,SK):
                     continue
                 nodestr = nodestr +str(nodee)+","
             nodestr2 = "Node "+str(node) + " is connected to nodes outside community: "
-            out_list = [element for element in nodelist if element not in common]
+            out_list = [element for element in nodelist if element not in commonset]
+            if NEIGHBORHOOD is not None:#只描述采样后邻域中的节点
+                out_list = [element for element in out_list if element in G_judge2]
             for nodee in out_list:
                 if(nodee==out_list[-1]):
                     nodestr2 = nodestr2 + str(nodee) + ". "
@@ -548,7 +1538,7 @@ def Graphencoder(seed_list,G,i,K,SK):
         return graphtext_judge2
 
 
-def instrucionstr(seed_list,G,i,K):#输入当前社区，图结构，分类符i和参数K。获取节点选择或者节点补充的指令
+def instrucionstr(seed_list,G,i,K,state=None,cache=None):#输入当前社区，图结构，分类符i和参数K。获取节点选择或者节点补充的指令
     """
     输入当前社区、图结构、分类符i和参数K，获取节点选择或者节点补充的指令。
 
@@ -557,17 +1547,24 @@ def instrucionstr(seed_list,G,i,K):#输入当前社区，图结构，分类符i
     G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
     i (int): 分类符，用于确定获取指令的类型（1：节点选择，2：节点补充）。
     K (int): 潜在节点的数量。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
 
     返回值:
     str: 对应分类符的指令字符串，用于指导节点选择或节点补充操作。
     """
+    if(i == 1 and BATCHSIZE > 1):#一次选择多个节点
+        instruction = "You're doing local community detection. Based on the graph data and prompt, please select up to " + str(BATCHSIZE) + " nodes that you think are most likely to belong to the current community"+ str(seed_list) + " for community expansion, ranked from most to least likely. Provide a detailed explanation."
+
+        return instruction
+
     if(i == 1):#节点选择
         instruction = "You're doing local community detection. Based on the graph data and prompt, please select a node that you think is most likely to belong to the current community"+ str(seed_list) + " for community expansion. Provide a detailed explanation."# You are a person who speaks briefly. You only tell the result when answering the question, without giving the reason. You only need to output the number of selected node"
 
         return instruction
 
     if(i==2):#节点补充
-        mpath = Mpatch(seed_list, G,K)
+        mpath = Mpatch(seed_list, G,K,state,cache)
 
         instruction = "Please analyze whether these nodes" + str(mpath) + " should be added to the community" + str(seed_list) + ". The probability of not adding nodes is higher. But it doesn't mean you always refuse to add nodes. If you think there is a suitable node, please output its node number."
 
@@ -588,7 +1585,11 @@ def prompt(i,promptselect,candidate):
     str: 对应分类符和提示符选择符的提示符字符串，用于指导用户操作。
     """
     if(i == 1):#节点选择
-        prompt_NSG = "Please find the node that best meets these two guides from the outside nodes " + str(candidate) + " to answer the question. Guide 1:The more an outside node is connected to other outside nodes, the higher the likelihood of its selection. Guide 2:Prioritize selecting outside nodes that are connected to multiple nodes within the community."
+        if BATCHSIZE > 1:#一次选择多个节点时要求按两条准则给出排名
+            target = "up to " + str(BATCHSIZE) + " nodes that best meet these two guides, ranked from best to worst,"
+        else:
+            target = "the node that best meets these two guides"
+        prompt_NSG = "Please find " + target + " from the outside nodes " + str(candidate) + " to answer the question. Guide 1:The more an outside node is connected to other outside nodes, the higher the likelihood of its selection. Guide 2:Prioritize selecting outside nodes that are connected to multiple nodes within the community."
 
         prompt_fewshot = "Here are some examples for your reference:Example 1:(1)Graph data：G describes a graph among nodes a，b，c，d，f，g，h,  j.In this graph: Node a connects nodes b,d,g.Node b connects nodes a,c,d,f,h,j.Node c connects nodes b,d.Node d connects nodes a,b,c,f,g.Node f connects nodes b,d,j.Node g connects nodes a,d.Node h connects nodes b.Node j connects nodes b,f.  Supplementary knowledge: Nodes in the current community: [a,b].The outside nodes contains :[c,d,f,h,g,j].Node c is connected to nodes within the community:b. Node c is connected to nodes outside community: d. Node d is connected to nodes within the community:a, b. Node d is connected to nodes outside community: c,f,g. Node f is connected to nodes within the community:b. Node f is connected to nodes outside community: d,j. Node g is connected to nodes within the community:a. Node g is connected to nodes outside community: d. Node h is connected to nodes within the community:b. Node h is connected to nodes outside community: null.Node j is connected to nodes within the community:b. Node j is connected to nodes outside community: f.(2)Question: You're doing local community detection. Based on the graph data, please select a node that you think is most likely to belong to the current community[a,b] for community expansion.(3)Answer:Node d.  Example 2:(1)Graph data：G describes a graph among nodes a，b，c，d，e，f. In this graph: Node a connects nodes b,c,d,e.Node b connects nodes a,c.Node c connects nodes a,b,d,f.Node d connects nodes a,c.Node e connects nodes a,f.Node f connects nodes c,e.Supplementary knowledge: Nodes in the current community: [a,b,c]. The outside nodes contains [d,e,f].Node d is connected to nodes within the community:a,c. Node d is connected to nodes outside community: null.Node e is connected to nodes within the community:a. Node e is connected to nodes outside community: f.Node f is connected to nodes within the community:c. Node f is connected to nodes outside community: e.(2)Question:  You're doing local community detection. Based on the graph data, please select a node that you think is most likely to belong to the current community[a,b,c] for community expansion.(3)Answer:Node d"
         prompt_zeroshot = "null"
@@ -635,102 +1636,1392 @@ def extract_number_from_string(input_string):
         # 没有找到数字
         return None
 
+def extract_numbers_from_string(input_string):
+    """
+    从输入字符串中按顺序提取所有数字，重复的数字只保留第一次出现。
+
+    参数:
+    input_string (str): 输入的字符串。
 
-def getgpt(data):#
+    返回值:
+    list: 整数列表，没有找到数字时为空列表。
     """
-    调用GPT API并返回生成的回复。
+    numbers = []
+    for match in re.findall(r'\d+', input_string):
+        if int(match) not in numbers:
+            numbers.append(int(match))
+    return numbers
+
+def parsestructured(reply):
+    """
+    从结构化回复中解析选择的节点。依次尝试回复中最后一个含"node"键的JSON对象，以及只包含节点编号或null的回复。
 
     参数:
-    data (str): 用户输入的数据，将作为用户对话内容发送给GPT。
+    reply (str): GPT的回复，通常以{"node": 节点编号}或{"node": null}结尾。
 
     返回值:
-    str: GPT模型生成的回复。
+    tuple: (是否解析成功, 节点编号或None)。解析失败时需要再请求GPT从回复中提取节点。
+    """
+    for text in reversed(re.findall(r'\{[^{}]*\}', reply)):
+        try:
+            answer = json.loads(text)
+        except ValueError:
+            continue
+        if not isinstance(answer, dict) or "node" not in answer:
+            continue
+        node = answer["node"]
+        if node is None or (isinstance(node, str) and node.strip().lower() in ("", "null", "none")):
+            return True, None
+        if isinstance(node, bool):
+            continue
+        if isinstance(node, int):
+            return True, node
+        if isinstance(node, str) and re.fullmatch(r'\s*\d+\s*', node):
+            return True, int(node)
+    text = reply.strip().strip('`"\'.').strip()
+    if text.lower() == "null":
+        return True, None
+    if re.fullmatch(r'\d+', text):
+        return True, int(text)
+    return False, None
+
+def parsestructurednodes(reply):
+    """
+    parsestructured的多节点版本，解析回复中最后一个含"nodes"键的JSON对象，例如{"nodes": [5, 12]}。
+    也接受{"node": ...}以及只包含节点编号列表或null的回复。
+
+    参数:
+    reply (str): GPT的回复。
+
+    返回值:
+    tuple: (是否解析成功, 按排名排列的节点编号列表)。
+    """
+    for text in reversed(re.findall(r'\{[^{}]*\}', reply)):
+        try:
+            answer = json.loads(text)
+        except ValueError:
+            continue
+        if not isinstance(answer, dict) or not isinstance(answer.get("nodes"), list):
+            continue
+        nodes = []
+        for node in answer["nodes"]:
+            if isinstance(node, str) and re.fullmatch(r'\s*\d+\s*', node):
+                node = int(node)
+            if isinstance(node, int) and not isinstance(node, bool) and node not in nodes:
+                nodes.append(node)
+        return True, nodes
+    found, node = parsestructured(reply)
+    if found:
+        return True, [] if node is None else [node]
+    text = reply.strip().strip('`"\'.[]').strip()
+    if re.fullmatch(r'\d+(\s*,\s*\d+)*', text):
+        return True, extract_numbers_from_string(text)
+    return False, []
+
+
+_encodings = {}  # 模型名称 -> tiktoken分词器，无法加载时为None
+
+def num_tokens(text, model="gpt-3.5-turbo-0125"):
+    """
+    使用tiktoken计算文本的token数。分词器文件无法加载时（如离线使用llmserver的替身时无法下载），
+    改为按每4个字符约1个token估计，该选择只做一次并记录一条警告。
+
+    参数:
+    text (str): 需要计算的文本。
+    model (str): 模型名称，用于选择分词器；无法识别时使用cl100k_base。
+
+    返回值:
+    int: 文本的token数。
+    """
+    if model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as error:  # 下载或读取分词器文件失败
+            logger.warning("无法加载tiktoken分词器（" + str(error) + "），按每4个字符1个token估计")
+            _encodings[model] = None
+    if _encodings[model] is None:
+        return len(text) // 4
+    return len(_encodings[model].encode(text))
+
+def llmsdata(seed_list,G,i,K,SK,promptselect,state=None,cache=None,limit2=None,sklines=None):
+    """
+    构建llms输入给GPT的完整文本（图数据、提示符和问题）。参数含义同llms和Graphencoder。
+
+    返回值:
+    str: 输入给GPT的文本。
+    """
+    candidate = getevalcanidate(seed_list, G,K,state,cache)
+    return "(1)Graph data：" + Graphencoder(seed_list, G, i, K,SK,state,cache,limit2,sklines) + ".\n(2)Prompt:" + prompt(
+        i,promptselect,candidate) + "\n(3)Question:" + instrucionstr(seed_list, G, i,K,state,cache)
+
+def budgetencode(seed_list,G,i,K,SK,promptselect,budget,state=None,cache=None,model="gpt-3.5-turbo-0125"):
     """
-    #配置网络信息
-    os.environ["http_proxy"] =
-    os.environ["https_proxy"] =
+    在token预算内构建输入给GPT的文本。超出预算时依次收缩编码：
+    节点选择（i=1）先减小K，K为1时再去掉补充知识；
+    节点补充（i=2）先按M值裁剪二阶邻居，再减少补充知识描述的节点，最后减小K。
+    每一步用二分方式收缩，只需O(log n)次token计数。
 
-    openai.api_key =  "yours"
+    参数:
+    seed_list (list): 当前社区的节点列表。
+    G (dict): 图结构。
+    i (int): 分类符（1：节点选择，2：节点补充）。
+    K (int): 潜在节点数量的上限。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符。
+    budget (int): token预算。
+    state (CommunityState): 可选的增量社区状态。
+    cache (StepCache): 可选的单步缓存。
+    model (str): 用于计数的模型名称。
+
+    返回值:
+    tuple: (文本, 实际使用的K, 文本的token数)。即使收缩到最小仍超出预算，也返回最小的编码。
+    """
+    def encode(k, sk=SK, limit2=None, sklines=None):
+        data = llmsdata(seed_list, G, i, k, sk, promptselect, state, cache, limit2, sklines)
+        return data, k, num_tokens(data, model)
+
+    def shrink(fits_at, lo, hi):
+        # 在[lo, hi]中找使编码满足预算的最大值，fits_at(hi)不满足、fits_at(lo)结果直接返回
+        best = fits_at(lo)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            result = fits_at(mid)
+            if result[2] <= budget:
+                lo, best = mid, result
+            else:
+                hi = mid - 1
+        return best
+
+    result = encode(K)
+    if result[2] <= budget:
+        return result
+    if i == 1:
+        result = shrink(lambda k: encode(k), 1, K)
+        if result[2] > budget and SK:
+            result = encode(1, False)
+        return result
+    outside = len(getjudgegrpah(seed_list, G, 3, K, state, cache)) - len(set(seed_list))
+    result = shrink(lambda n: encode(K, limit2=n), 0, outside)
+    if result[2] <= budget:
+        return result
+    result = shrink(lambda n: encode(K, limit2=0, sklines=n), 0, K)
+    if result[2] <= budget:
+        return result
+    return shrink(lambda k: encode(k, limit2=0, sklines=0), 1, K)
+
+class RateLimiter:
+    """
+    令牌桶限流器，同时限制每分钟请求数（rpm）和每分钟token数（tpm），以允许的速率发送请求，代替固定的暂停。
+    遇到429等限流错误时自适应降低速率并暂停一段时间，之后随成功的请求逐步恢复。
+    同一个限流器可以在多个线程和异步任务之间共享；shared为True时桶的状态保存在共享内存中，
+    在创建进程池之前创建并传给子进程（如通过initializer）即可在多个进程之间共享。
+
+    参数:
+    rpm (float): 每分钟请求数上限，None表示不限制。
+    tpm (float): 每分钟token数上限，None表示不限制。
+    shared (bool): 是否使用进程间共享的状态。
+    cooldown (float): 遇到限流错误后的暂停秒数。
+    """
+
+    def __init__(self, rpm=None, tpm=None, shared=False, cooldown=10):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.cooldown = cooldown
+        self.shared = shared
+        # 状态: [请求桶余量, token桶余量, 上次更新时间, 速率系数, 暂停截止时间]
+        initial = [rpm or 0, tpm or 0, time.time(), 1.0, 0.0]
+        if shared:
+            self._state = multiprocessing.Array('d', initial, lock=False)
+            self._lock = multiprocessing.Lock()
+        else:
+            self._state = initial
+            self._lock = threading.Lock()
+
+    def _take(self, tokens):
+        # 尝试取出一个请求和tokens个token，成功返回0，否则返回需要等待的秒数
+        with self._lock:
+            state = self._state
+            now = time.time()
+            if now < state[4]:
+                return state[4] - now
+            elapsed = now - state[2]
+            state[2] = now
+            wait = 0
+            if self.rpm:
+                state[0] = min(self.rpm, state[0] + elapsed * self.rpm * state[3] / 60)
+                if state[0] < 1:
+                    wait = max(wait, (1 - state[0]) * 60 / (self.rpm * state[3]))
+            if self.tpm:
+                tokens = min(tokens, self.tpm)
+                state[1] = min(self.tpm, state[1] + elapsed * self.tpm * state[3] / 60)
+                if state[1] < tokens:
+                    wait = max(wait, (tokens - state[1]) * 60 / (self.tpm * state[3]))
+            if wait > 0:
+                return wait
+            if self.rpm:
+                state[0] = state[0] - 1
+            if self.tpm:
+                state[1] = state[1] - tokens
+            return 0
+
+    def acquire(self, tokens=0):
+        """
+        阻塞直到可以发送一个包含tokens个token的请求。
+
+        参数:
+        tokens (int): 本次请求预计使用的token数。
+        """
+        wait = self._take(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._take(tokens)
+
+    async def aacquire(self, tokens=0):
+        """
+        acquire的异步版本，等待时不阻塞事件循环。
+
+        参数:
+        tokens (int): 本次请求预计使用的token数。
+        """
+        wait = self._take(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._take(tokens)
+
+    def charge(self, tokens):
+        """
+        按实际用量修正token桶（实际用量超出预计时扣除差额，少于预计时返还）。
+
+        参数:
+        tokens (int): 实际用量与预计用量之差。
+        """
+        if self.tpm:
+            with self._lock:
+                self._state[1] = min(self.tpm, self._state[1] - tokens)
+
+    def backoff(self):
+        """
+        遇到限流错误时调用：速率减半（最低为设定值的十分之一），并暂停cooldown秒。
+        """
+        with self._lock:
+            self._state[3] = max(0.1, self._state[3] / 2)
+            self._state[4] = time.time() + self.cooldown
+
+    def recover(self):
+        """
+        请求成功时调用：速率系数逐步恢复到1。
+        """
+        with self._lock:
+            self._state[3] = min(1.0, self._state[3] + 0.05)
+
+ratelimiters = {}  # 模型名称或后端的limitkey() -> RateLimiter
+
+def setratelimit(model, rpm=None, tpm=None, shared=False, backend=None):
+    """
+    设置限流器，getgpt和agetgpt在发送请求前会等待该限流器。
+    提供backend时只作用于该后端（同一接口地址和模型），否则作用于使用该模型的所有后端；两者都有时后端的限流器优先。
 
-    # 构建对话
-    messages = [
+    参数:
+    model (str): 模型名称。
+    rpm (float): 每分钟请求数上限。
+    tpm (float): 每分钟token数上限。
+    shared (bool): 是否在多个进程之间共享限流状态。
+    backend (LLMBackend): 可选，限流器所属的后端。
+
+    返回值:
+    RateLimiter: 创建的限流器。
+    """
+    key = model if backend is None else backend.limitkey()
+    ratelimiters[key] = RateLimiter(rpm, tpm, shared)
+    return ratelimiters[key]
+
+def getratelimiter(llm):
+    """
+    返回值:
+    RateLimiter: 后端llm使用的限流器，没有设置时为None。
+    """
+    return ratelimiters.get(llm.limitkey(), ratelimiters.get(llm.model))
+
+REQUESTRETRIES = 8  # 单个请求遇到限流错误或临时错误后的最大重试次数，None表示不限，见setrequestretry
+REQUESTDEADLINE = 600  # 单个请求（包括全部重试）的时间上限（秒），None表示不限
+REQUESTDELAY = 1.0  # 没有限流器时第一次重试前的等待秒数，之后每次加倍，最长60秒
+
+def setrequestretry(maxretries=8, deadline=600, delay=1.0):
+    """
+    设置单个GPT请求遇到限流错误（如HTTP 429）或临时错误（HTTP 5xx、超时、连接失败）后的重试方式。
+    限流错误在有限流器时由限流器降低速率并暂停，其他情况按指数退避等待（带随机抖动）。重试次数或时间用完后抛出最后一次的错误，避免额度耗尽或密钥失效时无限等待。
+
+    参数:
+    maxretries (int): 最大重试次数，None表示不限。
+    deadline (float): 单个请求的时间上限（秒），None表示不限。
+    delay (float): 没有限流器时第一次重试前的等待秒数。
+
+    返回值:
+    tuple: 设置后的(REQUESTRETRIES, REQUESTDEADLINE, REQUESTDELAY)。
+    """
+    global REQUESTRETRIES, REQUESTDEADLINE, REQUESTDELAY
+    REQUESTRETRIES = maxretries
+    REQUESTDEADLINE = deadline
+    REQUESTDELAY = delay
+    return REQUESTRETRIES, REQUESTDEADLINE, REQUESTDELAY
+
+def _retryable(error):
+    return isinstance(error, (LLMRateLimitError, LLMTransientError))
+
+def _retrywait(error, retries, start, limiter):
+    # 请求出错后重试前需要等待的秒数，不应重试时返回None
+    if not _retryable(error):
+        return None
+    if REQUESTRETRIES is not None and retries >= REQUESTRETRIES:
+        return None
+    if REQUESTDEADLINE is not None and time.monotonic() - start >= REQUESTDEADLINE:
+        return None
+    if limiter is not None and isinstance(error, LLMRateLimitError):  # 限流器降低速率并暂停，下一次acquire时等待
+        limiter.backoff()
+        return 0
+    return min(60, REQUESTDELAY * 2 ** retries) * random.uniform(0.5, 1.0)
+
+PRICES = {"gpt-3.5-turbo-0125": (0.0005, 0.0015)}  # 模型名称 -> (每1000个输入token的美元价格, 每1000个输出token的美元价格)
+
+class BudgetExceeded(Exception):
+    """
+    发送请求会超出token或费用预算时由getgpt和agetgpt抛出。
+    """
+
+class RunBudgetExceeded(BudgetExceeded):
+    """
+    整个运行的预算（上一级预算）用完时抛出。与种子预算不同，扩展不会返回不完整的社区，而是一直抛出到种子循环，
+    由arunseeds、coverseeds、runseedspool或驱动脚本停止整个运行；该种子的stats记为{"stopped": "budget"}，不计分也不写入日志。
+    """
+
+class Budget:
+    """
+    token和费用预算。getgpt在发送请求前用tiktoken估计的输入token数预留预算，收到回复后按API返回的usage扣除实际用量并释放预留，
+    因此同时进行的请求不会一起越过上限。parent为上一级预算（例如整个运行的预算），预留和扣除时同时作用于上一级预算，
+    本级超出时抛出BudgetExceeded，上一级超出时抛出RunBudgetExceeded。
+    shared为True时用量保存在共享内存中，与RateLimiter一样可以在创建进程池之前创建并传给子进程。
+
+    参数:
+    tokens (int): token数上限，None表示不限制。
+    dollars (float): 费用上限（美元），None表示不限制，价格见PRICES。
+    parent (Budget): 可选，上一级预算。
+    shared (bool): 是否使用进程间共享的状态。
+    """
+
+    def __init__(self, tokens=None, dollars=None, parent=None, shared=False):
+        self.tokens = tokens
+        self.dollars = dollars
+        self.parent = parent
+        self.shared = shared
+        # 状态: [已用token数, 已用费用, 请求数, 预留token数, 预留费用]
+        if shared:
+            self._state = multiprocessing.Array('d', [0, 0, 0, 0, 0], lock=False)
+            self._lock = multiprocessing.Lock()
+        else:
+            self._state = [0, 0, 0, 0, 0]
+            self._lock = threading.Lock()
+
+    @staticmethod
+    def cost(model, prompt_tokens, completion_tokens=0):
+        """
+        返回值:
+        float: 按PRICES计算的费用（美元），未知模型为0。
+        """
+        prices = PRICES.get(model, (0, 0))
+        return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+    def reserve(self, model, tokens):
+        """
+        为一个输入为tokens个token的请求预留预算，超出上限时抛出BudgetExceeded且不预留。
+
+        参数:
+        model (str): 模型名称。
+        tokens (int): 预计的输入token数。
+        """
+        dollars = self.cost(model, tokens)
+        with self._lock:
+            state = self._state
+            if self.tokens is not None and state[0] + state[3] + tokens > self.tokens:
+                raise BudgetExceeded("token " + str(int(state[0] + state[3])) + "+" + str(tokens) + ">" + str(self.tokens))
+            if self.dollars is not None and state[1] + state[4] + dollars > self.dollars:
+                raise BudgetExceeded("$" + str(round(state[1] + state[4], 6)) + ">" + str(self.dollars))
+            state[3] = state[3] + tokens
+            state[4] = state[4] + dollars
+        if self.parent is not None:
+            try:
+                self.parent.reserve(model, tokens)
+            except BudgetExceeded as exceeded:
+                self._release(model, tokens)
+                if isinstance(exceeded, RunBudgetExceeded):
+                    raise
+                raise RunBudgetExceeded(str(exceeded)) from None
+
+    def _release(self, model, tokens):
+        with self._lock:
+            self._state[3] = max(0, self._state[3] - tokens)
+            self._state[4] = max(0, self._state[4] - self.cost(model, tokens))
+
+    def release(self, model, tokens):
+        """
+        请求没有完成时释放reserve预留的预算。
+        """
+        self._release(model, tokens)
+        if self.parent is not None:
+            self.parent.release(model, tokens)
+
+    def charge(self, model, usage, reserved=0):
+        """
+        扣除一次请求的实际用量，并释放为它预留的预算。
+
+        参数:
+        model (str): 模型名称。
+        usage (dict): API返回的usage，包含prompt_tokens和completion_tokens。
+        reserved (int): reserve预留的token数。
+        """
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        self._release(model, reserved)
+        with self._lock:
+            self._state[0] = self._state[0] + prompt_tokens + completion_tokens
+            self._state[1] = self._state[1] + self.cost(model, prompt_tokens, completion_tokens)
+            self._state[2] = self._state[2] + 1
+        if self.parent is not None:
+            self.parent.charge(model, usage, reserved)
+
+    def spent(self):
+        """
+        返回值:
+        dict: {"tokens": 已用token数, "dollars": 已用费用, "requests": 请求数}。
+        """
+        with self._lock:
+            return {"tokens": int(self._state[0]), "dollars": self._state[1], "requests": int(self._state[2])}
+
+SEEDBUDGET = (None, None)  # 每个种子的(token数上限, 费用上限)，见setbudget
+runbudget = None  # 整个运行的预算
+_budget = contextvars.ContextVar("budget", default=None)  # 当前线程或异步任务的请求计入的预算
+
+def setbudget(seedtokens=None, seeddollars=None, runtokens=None, rundollars=None, shared=False):
+    """
+    设置每个种子和整个运行的token和费用预算。种子超出预算时停止该种子的扩展，返回目前M值最大的社区；
+    整个运行超出预算时抛出RunBudgetExceeded，正在扩展的种子不返回结果，整个运行停止，之后的种子不再处理。
+    每个种子的用量记入stats的"tokens"和"dollars"。
+
+    参数:
+    seedtokens (int): 每个种子（包括其全部迭代）的token数上限。
+    seeddollars (float): 每个种子的费用上限（美元）。
+    runtokens (int): 整个运行的token数上限。
+    rundollars (float): 整个运行的费用上限（美元）。
+    shared (bool): 整个运行的预算是否在进程池的各进程之间共享，否则每个工作进程各自计算。
+
+    返回值:
+    Budget: 整个运行的预算，没有设置运行预算时为None。
+    """
+    global SEEDBUDGET, runbudget
+    SEEDBUDGET = (seedtokens, seeddollars)
+    runbudget = Budget(runtokens, rundollars, shared=shared) if runtokens is not None or rundollars is not None else None
+    return runbudget
+
+def seedbudget():
+    """
+    返回值:
+    Budget: 按setbudget的设置为一个种子新建的预算，没有设置任何预算时为None。
+    """
+    if SEEDBUDGET == (None, None) and runbudget is None:
+        return None
+    return Budget(SEEDBUDGET[0], SEEDBUDGET[1], runbudget)
+
+class ResponseCache:
+    """
+    基于SQLite的GPT回复缓存，键为模型、对话消息、采样参数以及该请求在同一种子的扩展中第几次出现的哈希值
+    （不在种子扩展中发出的请求按本次运行计数）。同一提示多次出现（如多次迭代都从[seed]出发、格式错误后的重试）时
+    依次对应不同的缓存条目，因此重新运行实验会按原顺序重放已有的回复，而不会把同一个回复无限次返回给重试循环。
+    按种子计数使缓存键与种子的处理顺序、并发方式和由哪个工作进程处理无关。
+    多个进程可以各自打开同一个数据库文件，但不能共用同一个ResponseCache对象。
+
+    命中时只在内存中记下访问时间，每FLUSHHITS次命中或每FLUSHSECONDS秒（以及写入新条目、淘汰和close时）才批量写回数据库，
+    进程异常退出时丢失的只是最近的访问时间，仅影响淘汰顺序。条目数超过maxentries的(1+EVICTSLACK)倍时才一次淘汰到maxentries，
+    而不是每次写入都对整张表排序。
+
+    参数:
+    path (str): SQLite数据库文件路径。
+    maxentries (int): 可选，最多保留的条目数，超出后按批淘汰最久未使用的条目。
+    maxage (float): 可选，条目的最长保留秒数。
+    readonly (bool): 只读重放模式，未命中时抛出KeyError而不是调用API，也不写入新条目。
+    """
+    FLUSHHITS = 100  # 积累多少次命中的访问时间后写回数据库
+    FLUSHSECONDS = 5.0  # 访问时间最多延迟多少秒写回
+    EVICTSLACK = 0.1  # 条目数超出maxentries的比例达到此值时才淘汰
+
+    def __init__(self, path, maxentries=None, maxage=None, readonly=False):
+        self.path = path
+        self.maxentries = maxentries
+        self.maxage = maxage
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self._seen = {}  # 请求哈希 -> 本次运行中出现的次数
+        self._accessed = {}  # 尚未写回数据库的缓存键 -> 访问时间
+        self._flushed = time.time()
+        self._entries = 0  # 条目数，写入时累加，淘汰时重新统计；其他进程写入的条目只在淘汰时计入
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)  # 多个进程写入时等待锁
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, reply TEXT, usage TEXT, created REAL, accessed REAL)")
+        if not readonly:
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self.evict()
+
+    def lookup(self, model, messages, params=None):
+        """
+        查找请求对应的回复。
+
+        参数:
+        model (str): 模型名称。
+        messages (list): 对话消息列表。
+        params (dict): 可选，采样参数（如temperature）。
+
+        返回值:
+        tuple: (缓存键, 回复)，未命中时回复为None。只读模式下未命中抛出KeyError。
+        """
+        request = json.dumps({"model": model, "messages": messages, "params": params or {}}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(request.encode("utf-8")).hexdigest()
+        with self._lock:
+            seen = _cacheseen.get()
+            if seen is None:
+                seen = self._seen
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            key = digest + ":" + str(occurrence)
+            row = self._db.execute("SELECT reply FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits = self.hits + 1
+                if not self.readonly:
+                    now = time.time()
+                    self._accessed[key] = now
+                    if len(self._accessed) >= self.FLUSHHITS or now - self._flushed >= self.FLUSHSECONDS:
+                        self._writeaccessed()
+                        self._db.commit()
+                return key, row[0]
+            self.misses = self.misses + 1
+        if self.readonly:
+            raise KeyError("response not in cache (replay mode): " + key)
+        return key, None
+
+    def store(self, key, reply, usage=None):
+        """
+        写入回复，同时写回积累的访问时间；条目数超过maxentries的(1+EVICTSLACK)倍时淘汰旧条目。
+
+        参数:
+        key (str): lookup返回的缓存键。
+        reply (str): GPT的回复。
+        usage (dict): 可选，API返回的token用量。
+        """
+        if self.readonly:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, reply, json.dumps(usage) if usage is not None else None, now, now))
+            self._writeaccessed()
+            self._db.commit()
+            self._entries = self._entries + 1
+            full = self.maxentries is not None and self._entries > self.maxentries * (1 + self.EVICTSLACK)
+        if full:
+            self.evict()
+
+    def _writeaccessed(self):
+        # 批量写回积累的访问时间，调用方持有锁并负责提交
+        if self._accessed:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(t, key) for key, t in self._accessed.items()])
+            self._accessed.clear()
+        self._flushed = time.time()
+
+    def flush(self):
+        """
+        把积累的访问时间写回数据库。
+        """
+        with self._lock:
+            if self._accessed:
+                self._writeaccessed()
+                self._db.commit()
+
+    def evict(self):
+        """
+        删除超过maxage的条目，并在条目数超过maxentries时按最久未使用的顺序删除多出的条目。
+        """
+        if self.readonly:
+            return
+        with self._lock:
+            self._writeaccessed()
+            if self.maxage is not None:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.maxage,))
+            self._entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if self.maxentries is not None and self._entries > self.maxentries:
+                self._db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                                 (self._entries - self.maxentries,))
+                self._entries = self.maxentries
+            self._db.commit()
+
+    def close(self):
+        """
+        写回积累的访问时间并关闭数据库连接。
+        """
+        self.flush()
+        self._db.close()
+
+    def stats(self):
+        """
+        返回值:
+        dict: 命中次数、未命中次数、命中率和当前条目数。
+        """
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitrate": round(self.hits / total, 4) if total else 0.0, "entries": entries}
+
+responsecache = None  # getgpt和agetgpt使用的回复缓存，由setresponsecache设置
+_cacheseen = contextvars.ContextVar("cacheseen", default=None)  # 当前种子的请求哈希 -> 出现次数，见ResponseCache
+
+def setresponsecache(path, maxentries=None, maxage=None, readonly=False):
+    """
+    设置getgpt和agetgpt使用的回复缓存，参数同ResponseCache；path为None时关闭缓存。
+
+    返回值:
+    ResponseCache: 创建的缓存。
+    """
+    global responsecache
+    responsecache = ResponseCache(path, maxentries, maxage, readonly) if path is not None else None
+    return responsecache
+
+#配置网络信息
+PROXY = ""  # 代理地址，例如"http://127.0.0.1:7890"；为空时不设置代理
+API_KEY = "yours"  # 为"yours"时使用环境变量OPENAI_API_KEY
+MODEL = "gpt-3.5-turbo-0125"  # 使用 GPT-3.5 Turbo 模型
+
+class LLMRateLimitError(Exception):
+    """
+    后端返回限流错误（如HTTP 429）时抛出，getgpt据此退避重试。
+    """
+
+class LLMTransientError(Exception):
+    """
+    后端返回临时错误（如HTTP 5xx、超时或连接失败）时抛出，getgpt据此有限次地重试。
+    """
+
+class LLMBackend:
+    """
+    GPT后端接口。子类实现chat（以及可选的achat），getgpt和agetgpt通过当前后端发送请求。
+
+    属性:
+    model (str): 模型名称，同时用于选择限流器、回复缓存的键和token计数。
+    endpoint (str): 接口地址，与model一起用于选择限流器，见limitkey。
+    """
+    model = MODEL
+    endpoint = None
+
+    def limitkey(self):
+        """
+        返回值:
+        tuple: (接口地址, 模型名称)，setratelimit(..., backend=...)以此为键，访问同一接口和模型的后端共用限流器。
+        """
+        return (self.endpoint, self.model)
+
+    def chat(self, messages):
+        """
+        发送对话并返回回复。
+
+        参数:
+        messages (list): 对话消息列表。
+
+        返回值:
+        tuple: (回复文本, token用量字典或None)。遇到限流时抛出LLMRateLimitError，遇到临时错误时抛出LLMTransientError。
+        """
+        raise NotImplementedError
+
+    async def achat(self, messages):
+        """
+        chat的异步版本，默认在线程池中执行chat。
+        """
+        return await asyncio.to_thread(self.chat, messages)
+
+def _openaierror(error):
+    # 把openai的异常转换为LLMRateLimitError或LLMTransientError，其他异常原样返回
+    if isinstance(error, openai.error.RateLimitError):
+        return LLMRateLimitError(str(error))
+    transient = (openai.error.Timeout, openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.TryAgain)
+    if isinstance(error, transient) or (isinstance(error, openai.error.APIError) and (error.http_status or 0) >= 500):
+        return LLMTransientError(str(error))
+    return error
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI ChatCompletion后端。代理和密钥在创建时配置一次，而不是每次请求都设置。
+
+    参数:
+    model (str): 模型名称。
+    api_key (str): API密钥，默认使用API_KEY或环境变量OPENAI_API_KEY。
+    proxy (str): 代理地址，默认使用PROXY。
+    api_base (str): 可选，OpenAI兼容接口的地址。
+    """
+
+    def __init__(self, model=MODEL, api_key=None, proxy=None, api_base=None):
+        self.model = model
+        if api_key is None:
+            api_key = os.environ.get("OPENAI_API_KEY", API_KEY) if API_KEY == "yours" else API_KEY
+        self.api_key = api_key
+        self.api_base = api_base
+        self.endpoint = api_base or "openai"
+        proxy = PROXY if proxy is None else proxy
+        if proxy:
+            os.environ["http_proxy"] = proxy
+            os.environ["https_proxy"] = proxy
+
+    def _params(self, messages):
+        params = {"model": self.model, "messages": messages, "api_key": self.api_key}
+        if self.api_base:
+            params["api_base"] = self.api_base
+        return params
+
+    def chat(self, messages):
+        try:
+            response = openai.ChatCompletion.create(**self._params(messages))
+        except openai.error.OpenAIError as error:
+            translated = _openaierror(error)
+            if translated is error:
+                raise
+            raise translated from error
+        return response["choices"][0]['message']['content'], response.get("usage")
+
+    async def achat(self, messages):
+        try:
+            response = await openai.ChatCompletion.acreate(**self._params(messages))
+        except openai.error.OpenAIError as error:
+            translated = _openaierror(error)
+            if translated is error:
+                raise
+            raise translated from error
+        return response["choices"][0]['message']['content'], response.get("usage")
+
+class HTTPBackend(LLMBackend):
+    """
+    通过HTTP访问任意OpenAI兼容的chat-completions接口，例如本地的替身服务器llmserver.py。
+
+    参数:
+    base_url (str): 接口地址，例如"http://127.0.0.1:8000/v1"。
+    model (str): 模型名称。
+    api_key (str): 可选，放在Authorization请求头中的密钥。
+    timeout (float): 请求超时秒数。
+    """
+
+    def __init__(self, base_url, model=MODEL, api_key=None, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.endpoint = self.base_url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def chat(self, messages):
+        headers = {"Authorization": "Bearer " + self.api_key} if self.api_key else {}
+        try:
+            response = self._session.post(self.base_url + "/chat/completions", json={"model": self.model, "messages": messages},
+                                          headers=headers, timeout=self.timeout)
+        except (requests.Timeout, requests.ConnectionError) as error:
+            raise LLMTransientError(str(error)) from error
+        if response.status_code == 429:
+            raise LLMRateLimitError(response.text)
+        if response.status_code >= 500:
+            raise LLMTransientError(str(response.status_code) + " " + response.text)
+        response.raise_for_status()
+        body = response.json()
+        return body["choices"][0]['message']['content'], body.get("usage")
+
+backend = None  # getgpt和agetgpt使用的后端，由setbackend设置，默认为OpenAIBackend
+
+def setbackend(newbackend):
+    """
+    设置getgpt和agetgpt（以及llms等上层函数）使用的后端。
+
+    参数:
+    newbackend (LLMBackend): 新的后端。
+
+    返回值:
+    LLMBackend: 设置的后端。
+    """
+    global backend
+    backend = newbackend
+    return backend
+
+def getbackend():
+    """
+    返回值:
+    LLMBackend: 当前使用的后端，未设置时创建默认的OpenAIBackend。
+    """
+    if backend is None:
+        setbackend(OpenAIBackend())
+    return backend
+
+def gptmessages(data):
+    """
+    构建发送给GPT的对话。
+
+    参数:
+    data (str): 用户输入的数据。
+
+    返回值:
+    list: 对话消息列表。
+    """
+    return [
         {"role": "system", "content": "You are ChatGPT, a large language model trained by OpenAI."},
         {"role": "user", "content": data}
     ]
 
-    # 调用API以进行对话
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo-0125",  # 使用 GPT-3.5 Turbo 模型
-        messages=messages,
-    )
+class _Request:
+    """
+    getgpt和agetgpt共用的一次请求：查找回复缓存、预留预算、判断失败后是否重试、扣除用量并写入缓存。
+    两者只在等待限流器、后端和重试间隔的方式上不同。
+
+    参数:
+    data (str): 用户输入的数据。
+    trace (dict): tracespan返回的字段字典。
+    """
 
-    # 提取助手的回复
-    assistant_reply = response["choices"][0]['message']['content']
-    reason = response["choices"][0]['finish_reason']
+    def __init__(self, data, trace):
+        self.llm = getbackend()
+        self.messages = gptmessages(data)
+        self.trace = trace
+        self.key = None
+        self.cached = None
+        # 先查找回复缓存，命中的回复不计入预算
+        if responsecache is not None:
+            self.key, self.cached = responsecache.lookup(self.llm.model, self.messages)
+            if self.cached is not None:
+                trace["cached"] = True
+                logger.debug(self.cached)
+                return
+        self.limiter = getratelimiter(self.llm)
+        self.budget = _budget.get()
+        self.estimate = num_tokens(data, self.llm.model) if self.budget is not None or (self.limiter is not None and self.limiter.tpm) else 0
+        if self.budget is not None:
+            self.budget.reserve(self.llm.model, self.estimate)
+        trace.update({"cached": False, "retries": 0, "throttle": 0.0})
+        self.begin = time.monotonic()
+
+    def throttled(self, start):
+        """
+        记录从start起等待限流器的时间。
+        """
+        self.trace["throttle"] = self.trace["throttle"] + time.perf_counter() - start
+
+    def failed(self, error):
+        """
+        请求失败时调用，必须在except块中调用。
+
+        返回值:
+        float: 重试前等待的秒数；不可重试或重试次数、时间已用完时释放预留的预算并重新抛出error。
+        """
+        wait = _retrywait(error, self.trace["retries"], self.begin, self.limiter)
+        if wait is None:
+            if self.budget is not None:
+                self.budget.release(self.llm.model, self.estimate)
+            raise error
+        self.trace["retries"] = self.trace["retries"] + 1
+        logger.info("请求失败（" + str(error) + "），第" + str(self.trace["retries"]) + "次重试")
+        return wait
+
+    def done(self, reply, usage):
+        """
+        请求成功后扣除实际用量并写入回复缓存。
+
+        返回值:
+        str: 回复文本。
+        """
+        if usage:  # 后端（如HTTPBackend连接的服务器）可能省略部分字段，缺少的字段用估计值补齐
+            prompt_tokens = usage.get("prompt_tokens", self.estimate)
+            completion_tokens = usage.get("completion_tokens")
+            if completion_tokens is None:
+                completion_tokens = num_tokens(reply, self.llm.model)
+            usage = dict(usage, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                         total_tokens=usage.get("total_tokens", prompt_tokens + completion_tokens))
+        if self.limiter is not None:
+            self.limiter.recover()
+            if usage:
+                self.limiter.charge(usage["total_tokens"] - self.estimate)
+        if usage:
+            self.trace.update({"prompt_tokens": usage.get("prompt_tokens", 0), "completion_tokens": usage.get("completion_tokens", 0)})
+        if self.budget is not None:
+            self.budget.charge(self.llm.model, usage or {"prompt_tokens": self.estimate}, self.estimate)
+        if responsecache is not None:
+            responsecache.store(self.key, reply, usage)
+        logger.debug(reply)
+        return reply
 
-    print(assistant_reply)
-    # print(reason)
-    # print(response['usage'])
-    return assistant_reply
+def getgpt(data):#
+    """
+    调用GPT API并返回生成的回复。依次经过回复缓存、预算检查、限流器和当前后端。命中缓存的回复不计入预算。
+
+    参数:
+    data (str): 用户输入的数据，将作为用户对话内容发送给GPT。
 
+    返回值:
+    str: GPT模型生成的回复。
+    """
+    with tracespan("getgpt") as trace:
+        request = _Request(data, trace)
+        if request.cached is not None:
+            return request.cached
+        # 调用API以进行对话，遇到限流错误时退避重试
+        while True:
+            if request.limiter is not None:
+                start = time.perf_counter()
+                request.limiter.acquire(request.estimate)
+                request.throttled(start)
+            try:
+                reply, usage = request.llm.chat(request.messages)
+            except BaseException as error:
+                time.sleep(request.failed(error))
+                continue
+            return request.done(reply, usage)
 
-def llms(seed_list,G,i,K,SK,promptselect):
+async def agetgpt(data):
     """
-    输入当前社区、图、迭代次数、K、图编码方式和提示词，获得当前社区执行一次节点补充或节点选择后的社区。
+    getgpt的异步版本，等待网络响应时不阻塞事件循环。
 
     参数:
-    seed_list (list): 当前社区的节点列表。
-    G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
-    i (int): 分类符，用于确定执行节点选择还是节点补充（1：节点选择，2：节点补充）。
+    data (str): 用户输入的数据，将作为用户对话内容发送给GPT。
+
+    返回值:
+    str: GPT模型生成的回复。
+    """
+    with tracespan("getgpt") as trace:
+        request = _Request(data, trace)
+        if request.cached is not None:
+            return request.cached
+        while True:
+            if request.limiter is not None:
+                start = time.perf_counter()
+                await request.limiter.aacquire(request.estimate)
+                request.throttled(start)
+            try:
+                reply, usage = await request.llm.achat(request.messages)
+            except BaseException as error:
+                await asyncio.sleep(request.failed(error))
+                continue
+            return request.done(reply, usage)
+
+def _cancelled(steps, cancel):
+    # 被取消时关闭生成器
+    if cancel is not None and cancel.is_set():
+        steps.close()
+        return True
+    return False
+
+def runsteps(steps, ask=None, cancel=None):
+    """
+    驱动逐步生成器（llmsteps、expansionsteps）：把生成器产出的每段文本交给GPT，再把回复送回生成器。
+
+    参数:
+    steps (generator): 逐步生成器。
+    ask (callable): 可选，发送文本并返回回复的函数，默认为getgpt。
+    cancel (threading.Event): 可选，每次请求GPT之前检查，被设置时关闭生成器并返回None。
+
+    返回值:
+    object: 生成器的最终返回值，被取消时为None。请求超出预算时把BudgetExceeded送入生成器。
+    """
+    try:
+        data = next(steps)
+        while not _cancelled(steps, cancel):
+            try:
+                reply = (ask or getgpt)(data)
+            except BudgetExceeded as exceeded:  # 交给生成器处理，生成器不处理时继续向上抛出
+                data = steps.throw(exceeded)
+                continue
+            data = steps.send(reply)
+        return None
+    except StopIteration as stop:
+        return stop.value
+
+async def arunsteps(steps, ask=None, cancel=None):
+    """
+    runsteps的异步版本，默认使用agetgpt发送文本。
+
+    参数:
+    steps (generator): 逐步生成器。
+    ask (callable): 可选，发送文本并返回回复的异步函数，默认为agetgpt。
+    cancel (threading.Event): 可选，每次请求GPT之前检查，被设置时关闭生成器并返回None。
+
+    返回值:
+    object: 生成器的最终返回值，被取消时为None。
+    """
+    try:
+        data = next(steps)
+        while not _cancelled(steps, cancel):
+            try:
+                reply = await (ask or agetgpt)(data)
+            except BudgetExceeded as exceeded:
+                data = steps.throw(exceeded)
+                continue
+            data = steps.send(reply)
+        return None
+    except StopIteration as stop:
+        return stop.value
+
+def _stopped(seed, stats):
+    # 整个运行的预算用完，该种子没有结果
+    if stats is not None:
+        stats["stopped"] = "budget"
+    logger.info("运行预算已用完，种子" + str(seed) + "的扩展未完成，停止运行")
+
+class _Restarts:
+    """
+    runrestarts和arunrestarts共用的状态：各次扩展共享的单步缓存、取消标志、种子预算和回复缓存计数，
+    以及每次扩展单独的统计和trail。两者只在执行各次扩展的方式上不同。参数含义同runrestarts。
+    """
+
+    def __init__(self, seed, G, ns, iteration, K, SK, promptselect, tokenbudget, targetM, start):
+        self.seed = seed
+        self.G = G
+        self.params = (ns, K, SK, promptselect)
+        self.tokenbudget = tokenbudget
+        self.targetM = targetM
+        self.start = start
+        self.cache = StepCache()  # 各次迭代都从[seed]出发，共享缓存
+        self.cancel = threading.Event()
+        self.counts = [{} for i in range(iteration)]  # 每次扩展单独计数，结束后汇总
+        self.trails = [[] for i in range(iteration)]
+        self.budget = seedbudget()  # 各次迭代共用该种子的预算
+        self.seen = {}  # 各次迭代共用该种子的回复缓存计数
+
+    def steps(self, i):
+        """
+        返回值:
+        generator: 第i次扩展的expansionsteps生成器。
+        """
+        ns, K, SK, promptselect = self.params
+        return expansionsteps(self.seed, self.G, ns, K, SK, promptselect, self.cache, self.tokenbudget,
+                              self.counts[i], self.trails[i], self.start)
+
+    @contextlib.contextmanager
+    def restart(self, i):
+        """
+        第i次扩展的上下文：设置该种子的预算和回复缓存计数并记录耗时；整个运行的预算用完时取消其余扩展。
+        """
+        token = _budget.set(self.budget)
+        scope = _cacheseen.set(self.seen)
+        try:
+            with tracespan("expansion", seed=self.seed, restart=i) as trace:
+                yield trace
+        except RunBudgetExceeded:
+            self.cancel.set()  # 其余迭代不再请求GPT
+            raise
+        finally:
+            _budget.reset(token)
+            _cacheseen.reset(scope)
+
+    def finished(self, trace, community):
+        """
+        记录一次扩展的结果，M值达到targetM时取消其余扩展。
+
+        返回值:
+        list: community本身，被取消时为None。
+        """
+        trace.update({"size": len(community) if community is not None else 0, "cancelled": community is None})
+        if community is not None and self.targetM is not None and computeM(community, self.G) >= self.targetM:
+            self.cancel.set()
+        return community
+
+    def collect(self, result, stats, trail):
+        """
+        汇总各次扩展的统计、trail和该种子的用量。
+
+        返回值:
+        list: 已完成的各次扩展得到的社区列表。
+        """
+        for count in self.counts:
+            for key, n in count.items():
+                _count(stats, key, n)
+        if trail is not None:
+            trail.extend(self.trails)
+        if self.budget is not None:
+            spent = self.budget.spent()
+            _count(stats, "tokens", spent["tokens"])
+            _count(stats, "dollars", spent["dollars"])
+        return [community for community in result if community is not None]
+
+def runrestarts(seed,G,ns,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):
+    """
+    从同一个种子节点出发执行iteration次相互独立的社区扩展，返回各次扩展得到的社区。
+
+    参数:
+    seed (int): 初始种子节点。
+    G (dict): 图结构。
+    ns (bool): 是否进行节点补充。
+    iteration (int): 迭代次数。
     K (int): 潜在节点的数量。
     SK (bool): 是否包含补充知识的标志。
-    promptselect (int): 提示符选择符，确定使用哪种提示符。
+    promptselect (int): 提示符选择符。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool 或 int): 为True或正整数时用线程池同时执行各次扩展（整数为线程数），否则依次执行。
+    targetM (float): 可选，某次扩展得到的社区M值达到targetM后取消其余尚未完成的扩展。
+    stats (dict): 可选，累计各次扩展中节点选择的重试和回退次数，见llms；设置了预算时还累计该种子使用的token数和费用。
+                  整个运行的预算用完时记为{"stopped": "budget"}并抛出RunBudgetExceeded。
+    trail (list): 可选，为每次扩展追加一个列表，保存该次扩展各阶段的社区。
+    start (list): 可选，每次扩展的初始社区，默认为[seed]。
 
     返回值:
-    list: 更新后的社区节点列表。
+    list: 已完成的各次扩展得到的社区列表，被取消的扩展不计入。
+    """
+    restarts = _Restarts(seed, G, ns, iteration, K, SK, promptselect, tokenbudget, targetM, start)
+
+    def restart(i):
+        if restarts.cancel.is_set():
+            return None
+        with restarts.restart(i) as trace:
+            return restarts.finished(trace, runsteps(restarts.steps(i), cancel=restarts.cancel))
+
+    try:
+        if parallel and iteration > 1:
+            workers = iteration if parallel is True else min(int(parallel), iteration)
+            with ThreadPoolExecutor(workers) as executor:
+                result = list(executor.map(restart, range(iteration)))
+        else:
+            result = [restart(i) for i in range(iteration)]
+    except RunBudgetExceeded:
+        _stopped(seed, stats)
+        raise
+    return restarts.collect(result, stats, trail)
+
+async def arunrestarts(seed,G,ns,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):
+    """
+    runrestarts的异步版本，parallel为真时各次扩展作为协程同时进行，参数和返回值同runrestarts。
+    """
+    restarts = _Restarts(seed, G, ns, iteration, K, SK, promptselect, tokenbudget, targetM, start)
+
+    async def restart(i):
+        if restarts.cancel.is_set():
+            return None
+        with restarts.restart(i) as trace:
+            return restarts.finished(trace, await arunsteps(restarts.steps(i), cancel=restarts.cancel))
+
+    try:
+        if parallel:
+            result = await asyncio.gather(*[restart(i) for i in range(iteration)])
+        else:
+            result = [await restart(i) for i in range(iteration)]
+    except RunBudgetExceeded:
+        _stopped(seed, stats)
+        raise
+    return restarts.collect(result, stats, trail)
+
+#要求GPT从上一段回复中只输出节点编号或null
+PARSEINSTRUCTION = "The above paragraph is used to determine if a node should be added to the community and which one. If this paragraph determines that nodes can be added, please output nodes directly, otherwise output null. the scope of your answer is limited to nodes or null. please do not output anything other than nodes or null."
+STRUCTUREDINSTRUCTION = " After your analysis, end your answer with a JSON object on its own line in the form {\"node\": <node number>}, or {\"node\": null} if no node should be added."
+
+STRUCTUREDBATCHINSTRUCTION = " After your analysis, end your answer with a JSON object on its own line in the form {\"nodes\": [<node number>, ...]} listing the selected nodes from most to least likely, or {\"nodes\": []} if no node should be added."
+
+STRUCTURED = False  # 为True时要求GPT在回答末尾输出JSON，由parsestructured在本地解析，见setstructured
+
+def setstructured(enabled=True):
+    """
+    设置是否使用结构化输出。开启后每次节点选择或节点补充只需一次请求：提示末尾要求GPT输出{"node": ...}，
+    由parsestructured在本地解析；只有本地解析失败时才再发送PARSEINSTRUCTION请求GPT提取节点。
+
+    参数:
+    enabled (bool): 是否开启。
+
+    返回值:
+    bool: 设置后的值。
+    """
+    global STRUCTURED
+    STRUCTURED = enabled
+    return STRUCTURED
+
+MAXRETRIES = None  # 节点选择中重新请求GPT的最大次数，None表示不限，见setretrylimit
+DECISIONTIMEOUT = None  # 每次节点选择的时间预算（秒），None表示不限
+
+def setretrylimit(maxretries=3, timeout=None):
+    """
+    限制节点选择中GPT给出无效节点（不在局部子图中，或社区只有种子时仍选择种子）后的重新请求。
+    重试次数或时间用完后回退为getevalcanidate中Delta M最大的潜在节点。
+    时间预算在每次重试之前检查，不会中断正在进行的请求。
+
+    参数:
+    maxretries (int): 每次节点选择最多重新请求的次数，None表示不限。
+    timeout (float): 每次节点选择的时间预算（秒），None表示不限。
+
+    返回值:
+    tuple: 设置后的(MAXRETRIES, DECISIONTIMEOUT)。
+    """
+    global MAXRETRIES, DECISIONTIMEOUT
+    MAXRETRIES = maxretries
+    DECISIONTIMEOUT = timeout
+    return MAXRETRIES, DECISIONTIMEOUT
+
+HYBRIDGAP = None  # 混合模式的阈值，None表示每次节点选择都请求GPT，见sethybrid
+
+def sethybrid(threshold=0.5):
+    """
+    设置混合扩展模式：Delta M第一名与第二名的相对差距（deltagap）不小于threshold时直接选择第一名，
+    只在排名不明确时请求GPT。跳过的节点选择次数记入stats的"skipped"。
+
+    参数:
+    threshold (float): 0到1之间的阈值，None表示关闭混合模式。
+
+    返回值:
+    float: 设置后的阈值。
+    """
+    global HYBRIDGAP
+    HYBRIDGAP = threshold
+    return HYBRIDGAP
+
+BATCHSIZE = 1  # 每次节点选择请求GPT给出的节点数上限，见setbatch
+
+def setbatch(size=3):
+    """
+    设置每次节点选择请求GPT按可能性排序给出的节点数上限B。GPT选择的第一个有效节点照常加入社区，
+    其后的节点依次在本地检查加入后M值是否增大，遇到第一个不再增大M值的节点即停止，因此一次请求最多加入B个节点。
+
+    参数:
+    size (int): 节点数上限，1表示每次只选择一个节点（原始算法）。
+
+    返回值:
+    int: 设置后的节点数上限。
+    """
+    global BATCHSIZE
+    BATCHSIZE = max(int(size), 1)
+    return BATCHSIZE
+
+def _retryallowed(retries, start):
+    if MAXRETRIES is not None and retries >= MAXRETRIES:
+        return False
+    return DECISIONTIMEOUT is None or time.monotonic() - start < DECISIONTIMEOUT
+
+def _count(stats, key, n=1):
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + n
+
+def _askranked(data, seed_list, localgraphnodes):
+    if STRUCTURED:
+        reply = yield data + STRUCTUREDBATCHINSTRUCTION
+        found, ranked = parsestructurednodes(reply)
+    else:
+        reply = yield data
+        found = False
+    if not found:
+        reply2 = yield reply + PARSEINSTRUCTION
+        ranked = extract_numbers_from_string(reply2)
+    # 与逐个选择时相同：节点需在局部子图中，社区只有种子时不能选择种子
+    return [node for node in ranked if node in localgraphnodes and not (len(seed_list) == 1 and node == seed_list[0])]
+
+def _asknode(data):
+    if STRUCTURED:
+        reply = yield data + STRUCTUREDINSTRUCTION
+        found, outnum = parsestructured(reply)
+        if found:
+            return outnum
+    else:
+        reply = yield data
+    reply2 = yield reply + PARSEINSTRUCTION
+    return extract_number_from_string(reply2)
+
+def llmsteps(seed_list,G,i,K,SK,promptselect,state=None,cache=None,tokenbudget=None,stats=None):
+    """
+    llms的逐步版本。生成器每次yield一段需要发送给GPT的文本，并通过send接收GPT的回复，返回值与llms相同。
+    同步和异步的驱动（runsteps、arunsteps）共用这一实现。参数含义同llms。
     """
+    with tracespan("llms", i=i, size=len(seed_list)) as trace:
+        result = yield from _llmsteps(seed_list,G,i,K,SK,promptselect,state,cache,tokenbudget,stats,trace)
+        trace["result"] = len(result) if result else 0
+        return result
+
+def _llmsteps(seed_list,G,i,K,SK,promptselect,state,cache,tokenbudget,stats,trace):
     if (i == 1):  # 节点选择
         #获取输入给GPT的数据
-        candidate = getevalcanidate(seed_list, G,K)
+        with tracespan("prompt", i=1):
+            if tokenbudget is not None:
+                data, K, ntokens = budgetencode(seed_list, G, 1, K, SK, promptselect, tokenbudget, state, cache)
+                logger.debug("输入token数:" + str(ntokens) + " K=" + str(K))
+            else:
+                data = llmsdata(seed_list, G, 1, K, SK, promptselect, state, cache)#输入给GPT的文本
+        candidate = getevalcanidate(seed_list, G,K,state,cache)
         localgraphnodes = seed_list + candidate
-        communitystr = communirytostr(seed_list)  # 得到表述社区的字符串
-        G_neighborslist_1 = getneighbors1(seed_list, G)  # 一阶邻居列表
-        G_neighbors = getGneighbors(seed_list, G_neighborslist_1, G)  # 种子社区和一阶邻居组成的邻接表
-        communityout = [item for item in G_neighborslist_1 if item not in seed_list]
-        data = "(1)Graph data：" + Graphencoder(seed_list, G, 1, K,SK) + ".\n(2)Prompt:" + prompt(
-            1,promptselect,candidate) + "\n(3)Question:" + instrucionstr(seed_list, G, 1,K)#输入给GPT的文本
-        print(data)
-        #reply = getgpt_agent(data)
+        logger.debug(data)
         #与GPT的交互过程
-        reply = getgpt(data)+ "The above paragraph is used to determine if a node should be added to the community and which one. If this paragraph determines that nodes can be added, please output nodes directly, otherwise output null. the scope of your answer is limited to nodes or null. please do not output anything other than nodes or null."
-        reply2 = getgpt(reply)
-        outnum = extract_number_from_string(reply2)
+        start = time.monotonic()
+        retries = 0
+        fallback = False
+        ranked = []
+        if BATCHSIZE > 1:
+            ranked = yield from _askranked(data, seed_list, localgraphnodes)
+            while len(ranked) == 0:
+                if not _retryallowed(retries, start):
+                    fallback = True
+                    break
+                retries = retries + 1
+                ranked = yield from _askranked(data, seed_list, localgraphnodes)
+            outnum = ranked[0] if ranked else None
+        else:
+            outnum = yield from _asknode(data)
 
-        while(len(seed_list)==1 and outnum == seed_list[0]):
-            reply = getgpt(data) + "The above paragraph is used to determine if a node should be added to the community and which one. If this paragraph determines that nodes can be added, please output nodes directly, otherwise output null. the scope of your answer is limited to nodes or null. please do not output anything other than nodes or null."
-            reply2 = getgpt(reply)
-            outnum = extract_number_from_string(reply2)
+        while(BATCHSIZE == 1 and len(seed_list)==1 and outnum == seed_list[0]):
+            if not _retryallowed(retries, start):
+                fallback = True
+                break
+            retries = retries + 1
+            outnum = yield from _asknode(data)
 
-        while (outnum not in localgraphnodes):
-            reply = getgpt(data) + "The above paragraph is used to determine if a node should be added to the community and which one. If this paragraph determines that nodes can be added, please output nodes directly, otherwise output null. the scope of your answer is limited to nodes or null. please do not output anything other than nodes or null."
-            reply2 = getgpt(reply)
-            outnum = extract_number_from_string(reply2)
+        while (not fallback and outnum not in localgraphnodes):
+            if not _retryallowed(retries, start):
+                fallback = True
+                break
+            retries = retries + 1
+            outnum = yield from _asknode(data)
+
+        _count(stats, "decisions")
+        _count(stats, "retries", retries)
+        _count(stats, "fallbacks", int(fallback))
+        trace.update({"retries": retries, "fallback": fallback})
+        if fallback:
+            if len(candidate) == 0:
+                logger.info("重试" + str(retries) + "次后没有可回退的潜在节点，社区不变")
+                return seed_list
+            outnum = candidate[0]  # 回退为Delta M最大的潜在节点
+            logger.info("重试" + str(retries) + "次后回退为Delta M最大的节点" + str(outnum))
 
         seed_list.append(outnum)
-        print("添加" + str(outnum) + "进入社区，此时社区为" + str(seed_list))
+        added = [outnum]
+        for node in ranked[1:BATCHSIZE]:  # 依次加入排名靠后的节点，直到M值不再增大
+            if node in seed_list:
+                break
+            if state is not None:
+                state.sync(seed_list)
+                gain = state.computeM_add(node) - state.computeM()
+            else:
+                gain = computeM(seed_list + [node], G) - computeM(seed_list, G)
+            if gain <= 0:
+                break
+            seed_list.append(node)
+            added.append(node)
+            _count(stats, "batched")
+        print("添加" + str(outnum if len(added) == 1 else added) + "进入社区，此时社区为" + str(seed_list))
 
         return seed_list
 
     if(i == 2):#节点补充
         #获得输入给GPT的数据
-        candidate = getevalcanidate(seed_list, G,K)
-        judgedata = "(1)Graph data：" + Graphencoder(seed_list,G, 2,K,SK) + ".\n(2)Prompt:" + prompt(2,promptselect,candidate) +"\n(3)Question:" + instrucionstr(seed_list,G,2,K)
-        print(judgedata)
+        with tracespan("prompt", i=2):
+            if tokenbudget is not None:
+                judgedata, K, ntokens = budgetencode(seed_list, G, 2, K, SK, promptselect, tokenbudget, state, cache)
+                logger.debug("输入token数:" + str(ntokens) + " K=" + str(K))
+            else:
+                judgedata = llmsdata(seed_list, G, 2, K, SK, promptselect, state, cache)
+        logger.debug(judgedata)
         #与GPT交互
-        reply = getgpt(judgedata) + "The above paragraph is used to determine if a node should be added to the community and which one. If this paragraph determines that nodes can be added, please output nodes directly, otherwise output null. the scope of your answer is limited to nodes or null. please do not output anything other than nodes or null."
-        reply2 = getgpt(reply)
-        outnum = extract_number_from_string(reply2)
-        mpath = Mpatch(seed_list, G,K)
+        outnum = yield from _asknode(judgedata)
+        mpath = Mpatch(seed_list, G,K,state,cache)
         if (outnum in mpath):
             print("补充节点：", outnum)
             seed_list.append(outnum)
@@ -738,88 +3029,161 @@ def llms(seed_list,G,i,K,SK,promptselect):
         else:
             return 0
 
+def llms(seed_list,G,i,K,SK,promptselect,state=None,cache=None,tokenbudget=None,stats=None):
+    """
+    输入当前社区、图、迭代次数、K、图编码方式和提示词，获得当前社区执行一次节点补充或节点选择后的社区。
 
-def gptselectnodewithns(seed,G,iteration,K,SK,promptselect):
+    参数:
+    seed_list (list): 当前社区的节点列表。
+    G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    i (int): 分类符，用于确定执行节点选择还是节点补充（1：节点选择，2：节点补充）。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符，确定使用哪种提示符。
+    state (CommunityState): 可选的增量社区状态，候选节点的打分和图编码共用其维护的一阶邻居。
+    cache (StepCache): 可选的单步缓存，潜在节点、补充节点和局部子图在同一社区状态下只计算一次。
+    tokenbudget (int): 可选，输入文本的token预算，超出时由budgetencode收缩编码（可能减小本次使用的K）。
+    stats (dict): 可选，累计节点选择的次数（"decisions"）、重试次数（"retries"）和回退次数（"fallbacks"）。
+
+    返回值:
+    list: 更新后的社区节点列表。
     """
-    使用具有节点补充的算法，输入种子节点、图结构、迭代次数、参数K、是否使用补充知识、提示符，获得最终社区。通过多次迭代，使用GPT进行节点选择和节点补充，获得最终社区。
+    return runsteps(llmsteps(seed_list,G,i,K,SK,promptselect,state,cache,tokenbudget,stats))
+
+async def allms(seed_list,G,i,K,SK,promptselect,state=None,cache=None,tokenbudget=None,stats=None):
+    """
+    llms的异步版本，参数和返回值同llms。
+    """
+    return await arunsteps(llmsteps(seed_list,G,i,K,SK,promptselect,state,cache,tokenbudget,stats))
+
+def bestcommunity(communities,G):
+    """
+    从多个候选社区中选出M值最大的社区，M值相同时保留靠前的社区。
+
+    参数:
+    communities (list): 候选社区列表。
+    G (dict): 图结构。
+
+    返回值:
+    list: M值最大的社区。
+    """
+    maxcand = communities[0]
+    maxmcand = computeM(communities[0],G)
+    for cand in communities:
+        candm = computeM(cand,G)
+        if(candm>maxmcand):
+            maxcand = cand
+            maxmcand = candm
+    return maxcand
+
+def expansionsteps(seed,G,ns,K,SK,promptselect,cache=None,tokenbudget=None,stats=None,trail=None,start=None):
+    """
+    从[seed]（或start）出发进行一次社区扩展（gptselectnodewithns/gptselectnodewithoutns中的一次迭代）的逐步版本，
+    与llmsteps一样yield发送给GPT的文本并接收回复。
 
     参数:
     seed (int): 初始种子节点。
-    G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
-    iteration (int): 迭代次数。
+    G (dict): 图结构。
+    ns (bool): 是否进行节点补充。
     K (int): 潜在节点的数量。
     SK (bool): 是否包含补充知识的标志。
-    promptselect (int): 提示符选择符，确定使用哪种提示策略。
+    promptselect (int): 提示符选择符。
+    cache (StepCache): 可选的单步缓存，可在多次迭代间共享。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    stats (dict): 可选，累计节点选择的重试和回退次数，见llms。
+    trail (list): 可选，用于保存本次迭代各阶段的社区（即cands）的列表。
+    start (list): 可选，初始社区，默认为[seed]，见coverseeds。
 
     返回值:
-    list: 最终的社区节点列表。
+    list: 本次迭代得到的社区。进行节点补充时为各阶段社区中M值最大的一个。
+          GPT请求超出种子预算（BudgetExceeded被送入生成器）时停止扩展，返回目前各阶段社区中M值最大的一个；
+          超出整个运行的预算时抛出RunBudgetExceeded。
     """
-    i=0
-    result = []
-    while(i<iteration):
-        seed_list = [seed]
-        seed_list11 = []
-        candidate = getevalcanidate(seed_list, G, K)  #寻找潜在节点
-        count = 0
-        count2 = 0
-        sleepcount = 0
-        repeat = len(seed_list) - len(set(seed_list))
-        k = len(seed_list) / 3
-        stop = 0
-        cands = []
+    seed_list = list(start) if start else [seed]
+    state = CommunityState(G, seed_list)  # 增量维护社区的M值和一阶邻居
+    candidate = getevalcanidate(seed_list, G, K, state, cache)  #寻找潜在节点
+    repeat = len(seed_list) - len(set(seed_list))
+    k = len(seed_list) / 3
+    stop = 0
+    cands = [] if trail is None else trail
+    try:
         while (repeat<k and stop==0): #判断算法是否终止
             while ((len(candidate) > 0) and (repeat<k)):
                 if len(candidate) == 1:
                     seed_list.append(candidate[0])
-                    candidate = getevalcanidate(seed_list, G,K)
+                    candidate = getevalcanidate(seed_list, G,K,state,cache)
+                    repeat = len(seed_list) - len(set(seed_list))
+                    k = len(seed_list) / 3
+                    continue
+                if HYBRIDGAP is not None and deltagap(seed_list, G, state, cache) >= HYBRIDGAP:  # 第一名明显占优，不请求GPT
+                    seed_list.append(candidate[0])
+                    _count(stats, "skipped")
+                    logger.info("Delta M差距明显，直接添加" + str(candidate[0]) + "进入社区")
+                    candidate = getevalcanidate(seed_list, G,K,state,cache)
                     repeat = len(seed_list) - len(set(seed_list))
                     k = len(seed_list) / 3
                     continue
 
-                seed_list = llms(seed_list, G, 1,K,SK,promptselect)  # 节点选择
+                seed_list = yield from llmsteps(seed_list, G, 1,K,SK,promptselect,state,cache,tokenbudget,stats)  # 节点选择
                 repeat = len(seed_list) - len(set(seed_list))
                 k = len(seed_list) / 3
-                candidate = getevalcanidate(seed_list, G,K)
-                sleepcount = sleepcount + 1
-                if (sleepcount % 10 == 0):#缓解超过访问限制
-                    time.sleep(10)
+                candidate = getevalcanidate(seed_list, G,K,state,cache)
+            if not ns:
+                return seed_list
             tempcand = seed_list.copy()
             cands.append(tempcand)
             # 进行节点补充
-            flag2 = llms(seed_list, G, 2,K,SK,promptselect)
+            flag2 = yield from llmsteps(seed_list, G, 2,K,SK,promptselect,state,cache,tokenbudget,stats)
             if (flag2 == 0):
                 stop = 1
                 break
             else:
                 seed_list = flag2
-                candidate = getevalcanidate(seed_list, G,K)
-        cands.append(seed_list)
-        print(cands)
-        maxcand = cands[0]
-        maxmcand = computeM(cands[0],G)
-        for cand in cands:
-            candm = computeM(cand,G)
-            if(candm>maxmcand):
-                maxcand = cand
-                maxmcand = candm
-        result.append(maxcand)
-        i = i+1
+                candidate = getevalcanidate(seed_list, G,K,state,cache)
+    except RunBudgetExceeded:  # 整个运行的预算用完，不返回不完整的社区
+        raise
+    except BudgetExceeded as exceeded:  # 超出种子预算时返回目前M值最大的社区
+        logger.info("超出预算（" + str(exceeded) + "），停止扩展")
+    cands.append(seed_list)
+    print(cands)
+    return bestcommunity(cands, G)
+
+def gptselectnodewithns(seed,G,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):
+    """
+    使用具有节点补充的算法，输入种子节点、图结构、迭代次数、参数K、是否使用补充知识、提示符，获得最终社区。通过多次迭代，使用GPT进行节点选择和节点补充，获得最终社区。
+
+    参数:
+    seed (int): 初始种子节点。
+    G (dict): 图结构，使用字典表示，其中键是节点，值是与该节点相邻的节点列表。
+    iteration (int): 迭代次数。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符，确定使用哪种提示策略。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool 或 int): 是否同时执行各次迭代，见runrestarts。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后取消其余迭代。
+    stats (dict): 可选，累计该种子节点选择的次数、重试次数和回退次数，见llms。
+    trail (list): 可选，为每次迭代追加一个列表，保存该次迭代各阶段的社区，见runrestarts。
+    start (list): 可选，每次迭代的初始社区（应包含seed），默认为[seed]，见coverseeds。
+
+    返回值:
+    list: 最终的社区节点列表。
+    """
+    if stats is None:
+        stats = {}
+    result = runrestarts(seed, G, True, iteration, K, SK, promptselect, tokenbudget, parallel, targetM, stats, trail, start)
     #保存结果
     print("result:"+str(result))
-    max = result[0]
-    maxm = computeM(max,G)
+    print("节点选择统计:" + str(stats))
     for community in result:
-        m = computeM(community,G)
-        print(str(community) + "的M" + str(m))
-        if(m>maxm):
-            maxm = m
-            max = community
+        print(str(community) + "的M" + str(computeM(community,G)))
+    max = bestcommunity(result, G)
     print(max)
     return max
 
 
 
-def gptselectnodewithoutns(seed,G,iteration,K,SK,promptselect):#没有节点补充的算法，详细注释参考有节点补充的算法.
+def gptselectnodewithoutns(seed,G,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):#没有节点补充的算法，详细注释参考有节点补充的算法.
     """
     使用不具有节点补充的算法，输入种子节点、图结构、迭代次数、参数K、是否使用补充知识、提示符，获得最终社区。通过多次迭代，使用GPT进行节点选择，获得最终社区。
 
@@ -830,53 +3194,30 @@ def gptselectnodewithoutns(seed,G,iteration,K,SK,promptselect):#没有节点补
     K (int): 潜在节点的数量。
     SK (bool): 是否包含补充知识的标志。
     promptselect (int): 提示符选择符，确定使用哪种提示策略。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool 或 int): 是否同时执行各次迭代，见runrestarts。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后取消其余迭代。
+    stats (dict): 可选，累计该种子节点选择的次数、重试次数和回退次数，见llms。
+    trail (list): 可选，为每次迭代追加一个列表，保存该次迭代各阶段的社区，见runrestarts。
+    start (list): 可选，每次迭代的初始社区（应包含seed），默认为[seed]，见coverseeds。
 
     返回值:
     list: 最终的社区节点列表。
     """
-    i=0
-    result = []
-    while(i<iteration):
-        seed_list = [seed]
-        seed_list11 = []
-        candidate = getevalcanidate(seed_list, G,K)  #寻找潜在节点
-        count = 0
-        count2 = 0
-        sleepcount = 0
-        repeat = len(seed_list) - len(set(seed_list))
-        k = len(seed_list) / 3
-        stop = 0
-        while ((len(candidate) > 0) and (repeat<k)): #判断算法是否终止
-            if len(candidate) == 1:
-                seed_list.append(candidate[0])
-                candidate = getevalcanidate(seed_list, G,K)
-                repeat = len(seed_list) - len(set(seed_list))
-                k = len(seed_list) / 3
-                continue
-            seed_list = llms(seed_list, G, 1,K,SK,promptselect) # 节点选择
-            repeat = len(seed_list) - len(set(seed_list))
-            k = len(seed_list) / 3
-            candidate = getevalcanidate(seed_list, G,K)
-            sleepcount = sleepcount + 1
-            if (sleepcount % 10 == 0)::#缓解超过访问限制
-                time.sleep(10)
-        result.append(seed_list)
-        i = i+1
+    if stats is None:
+        stats = {}
+    result = runrestarts(seed, G, False, iteration, K, SK, promptselect, tokenbudget, parallel, targetM, stats, trail, start)
     # 保存结果
     print("result:"+str(result))
-    max = result[0]
-    maxm = computeM(max, G)
+    print("节点选择统计:" + str(stats))
     for community in result:
-        m = computeM(community, G)
-        print(str(community) + "的M" + str(m))
-        if (m > maxm):
-            maxm = m
-            max = community
+        print(str(community) + "的M" + str(computeM(community, G)))
+    max = bestcommunity(result, G)
     print("返回的社区是",max)
     return max
 
 
-def gpt_communityexpansion(seed,G,ns,iteration,K,SK,promptselect):
+def gpt_communityexpansion(seed,G,ns,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):
     """
     根据ns判断是否进行节点补充，并选择不同的算法进行社区扩展。
 
@@ -888,17 +3229,386 @@ def gpt_communityexpansion(seed,G,ns,iteration,K,SK,promptselect):
     K (int): 潜在节点的数量。
     SK (bool): 是否包含补充知识的标志。
     promptselect (int): 提示符选择符，确定使用哪种提示策略。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool 或 int): 是否同时执行各次迭代，见runrestarts。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后取消其余迭代。
+    stats (dict): 可选，累计该种子节点选择的次数、重试次数和回退次数，见llms。
+    trail (list): 可选，为每次迭代追加一个列表，保存该次迭代各阶段的社区，见runrestarts。
+    start (list): 可选，每次迭代的初始社区（应包含seed），默认为[seed]，见coverseeds。
 
     返回值:
     list: 最终的社区节点列表。
     """
     if(iteration<1):
         print("循环次数不能小于1")
-        return null
-    if(ns):
-        return gptselectnodewithns(seed,G,iteration,K,SK,promptselect)
+        return None
+    with tracespan("seed", seed=seed, iteration=iteration) as trace:
+        if(ns):
+            community = gptselectnodewithns(seed,G,iteration,K,SK,promptselect,tokenbudget,parallel,targetM,stats,trail,start)
+        else:
+            community = gptselectnodewithoutns(seed,G,iteration,K,SK,promptselect,tokenbudget,parallel,targetM,stats,trail,start)
+        trace["size"] = len(community)
+    return community
+
+async def agpt_communityexpansion(seed,G,ns,iteration,K,SK,promptselect,tokenbudget=None,parallel=False,targetM=None,stats=None,trail=None,start=None):
+    """
+    gpt_communityexpansion的异步版本，参数和返回值同gpt_communityexpansion。parallel为真时各次迭代作为协程同时进行。
+    """
+    if(iteration<1):
+        print("循环次数不能小于1")
+        return None
+    if stats is None:
+        stats = {}
+    with tracespan("seed", seed=seed, iteration=iteration) as trace:
+        result = await arunrestarts(seed, G, ns, iteration, K, SK, promptselect, tokenbudget, parallel, targetM, stats, trail, start)
+        print("result:"+str(result))
+        print("节点选择统计:" + str(stats))
+        community = bestcommunity(result, G)
+        trace["size"] = len(community)
+    return community
+
+async def arunseeds(alllist,G,ns,iteration,K,SK,promptselect,concurrency=8,tokenbudget=None,parallel=False,targetM=None,stats=None,journal=None):
+    """
+    并发扩展多个种子节点的社区。一个种子等待网络响应时，其他种子可以构建提示或发送请求。
+
+    参数:
+    alllist (list): 种子节点列表。
+    G (dict): 图结构。
+    ns (bool): 是否进行节点补充。
+    iteration (int): 迭代次数。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符。
+    concurrency (int): 同时扩展的种子数上限。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool): 是否同时进行每个种子的各次迭代，见arunrestarts。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后取消该种子的其余迭代。
+    stats (dict): 可选，填入种子节点 -> 该种子节点选择的次数、重试次数和回退次数。
+    journal (RunJournal): 可选，每个种子完成后立即写入其结果。
+
+    返回值:
+    dict: 种子节点 -> 最终社区。整个运行的预算用完时不再开始新的种子，只返回已完成的种子，
+          被中断的种子的stats记为{"stopped": "budget"}。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    unfinished = set()  # 因运行预算用完而没有结果的种子
+
+    async def expand(seed):
+        async with semaphore:
+            if unfinished:
+                unfinished.add(seed)
+                return seed, None
+            seedstats = {} if stats is None else stats.setdefault(seed, {})
+            trail = []
+            try:
+                community = await agpt_communityexpansion(seed, G, ns, iteration, K, SK, promptselect, tokenbudget, parallel, targetM, seedstats, trail)
+            except RunBudgetExceeded:
+                unfinished.add(seed)
+                return seed, None
+            if journal is not None:
+                journal.record(seed, community, trail, seedstats)
+            return seed, community
+
+    results = await asyncio.gather(*(expand(seed) for seed in alllist))
+    return {seed: community for seed, community in results if seed not in unfinished}
+
+def coverseeds(alllist,G,ns,iteration,K,SK,promptselect,mode="skip",tokenbudget=None,parallel=False,targetM=None,stats=None,journal=None):
+    """
+    覆盖模式：依次处理种子队列（可以是图中的全部节点），得到整个图的重叠社区覆盖，不再对每个种子独立扩展。
+    扩展一个种子之前通过倒排索引（节点 -> 覆盖中的社区）检查它是否已在发现的社区中：
+    mode为"skip"时不再扩展，以包含它的M值最大的社区作为其结果；
+    mode为"warm"时以该社区为初始社区继续扩展（而不是从[seed]开始），得到的社区包含原社区时替换原社区。
+    不在任何已发现社区中的种子照常从[seed]开始扩展。种子落在已扩展社区中越多，节省的GPT请求越多。
+
+    参数:
+    alllist (list): 种子队列，按顺序处理。
+    G (dict): 图结构。
+    ns (bool): 是否进行节点补充。
+    iteration (int): 迭代次数。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符。
+    mode (str): "skip"或"warm"。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    parallel (bool 或 int): 是否同时执行每个种子的各次迭代，见runrestarts。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后取消该种子的其余迭代。
+    stats (dict): 可选，填入种子节点 -> 该种子的节点选择统计，跳过的种子记为{"covered": 1}。
+    journal (RunJournal): 可选，每个种子（包括跳过的种子）处理完后立即写入其社区和在覆盖中的位置（cover字段：
+                          扩展的种子为{"index": 编号, "replaced": 热启动的原社区编号}，跳过的种子为{"index": 编号, "skipped": true}）。
+                          重新运行时按日志顺序重放这些记录，重建同样的覆盖，已记录的种子不再处理。
+
+    返回值:
+    tuple: (覆盖，即互不相同的社区列表, 种子节点 -> 该种子的社区)。扩展的种子对应它自己扩展得到的社区，
+           跳过的种子对应处理它时包含它的M值最大的社区，与日志中记录的社区相同；
+           热启动替换之后覆盖中的社区可能比这些社区更大。整个运行的预算用完时停止处理之后的种子，只返回已处理的种子。
+    """
+    if mode not in ("skip", "warm"):
+        raise ValueError("mode must be 'skip' or 'warm'")
+    cover = []
+    known = {}  # 社区节点集合 -> 覆盖中的编号，避免重复加入同一个社区
+    owner = {}  # 节点 -> 覆盖中包含该节点的社区编号
+    results = {}  # 种子节点 -> 该种子的社区
+
+    def add(community, replace=None):
+        members = frozenset(community)
+        if members in known:
+            return known[members]
+        if replace is not None and set(cover[replace]) <= members:  # 热启动得到的社区包含原社区，替换原社区
+            old = frozenset(cover[replace])
+            del known[old]
+            for node in old:
+                owner[node].remove(replace)
+            cover[replace] = community
+            index = replace
+        else:
+            cover.append(community)
+            index = len(cover) - 1
+        known[members] = index
+        for node in members:
+            owner.setdefault(node, []).append(index)
+        return index
+
+    if journal is not None:  # 按写入顺序重放，热启动的替换与原运行一致
+        for seed, record in journal.records.items():
+            community = record["community"]
+            position = record.get("cover") or {}
+            results[seed] = community
+            if community and not position.get("skipped"):
+                add(community, position.get("replaced"))
+    for seed in alllist:
+        if seed in results:
+            continue
+        seedstats = {} if stats is None else stats.setdefault(seed, {})
+        found = owner.get(seed)
+        best = max(found, key=lambda index: computeM(cover[index], G)) if found else None
+        if best is not None and mode == "skip":
+            _count(seedstats, "covered")
+            logger.info("种子" + str(seed) + "已在社区" + str(cover[best]) + "中，跳过")
+            results[seed] = list(cover[best])
+            if journal is not None:
+                journal.record(seed, results[seed], stats=seedstats, cover={"index": best, "skipped": True})
+            continue
+        trail = []
+        start = cover[best] if best is not None else None
+        try:
+            community = gpt_communityexpansion(seed, G, ns, iteration, K, SK, promptselect, tokenbudget, parallel, targetM,
+                                               seedstats, trail, start)
+        except RunBudgetExceeded:  # 运行预算用完，返回目前的覆盖
+            break
+        index = add(community, best) if community else None
+        results[seed] = community
+        if journal is not None:
+            journal.record(seed, community, trail, seedstats, cover={"index": index, "replaced": best})
+    return cover, results
+
+_pool = {}  # 进程池工作进程中的图、真实社区和扩展参数
+
+def _poolinit(snapshotfile, G, list_true, params, resources):
+    # 工作进程由fork创建，后端、各项set*设置、预算和追踪器都随进程复制；这里只重建不能跨进程共用的资源
+    if snapshotfile is not None:
+        G, list_true = load_snapshot(snapshotfile)
+    if not isinstance(list_true, GroundTruth):
+        list_true = GroundTruth(list_true or [])
+    _pool.update({"G": G, "truth": list_true, "params": params})
+    ratelimiters.clear()
+    ratelimiters.update(resources["limiters"])
+    # SQLite连接不能跨进程使用，每个工作进程重新打开回复缓存
+    if resources["responsecache"] is not None:
+        setresponsecache(**resources["responsecache"])
     else:
-        return gptselectnodewithoutns(seed,G,iteration,K,SK,promptselect)
+        setresponsecache(None)
+
+def _poolexpand(seed):
+    stats = {}
+    trail = []
+    try:
+        seed_list = gpt_communityexpansion(seed, _pool["G"], stats=stats, trail=trail, **_pool["params"])
+    except RunBudgetExceeded:
+        return seed, None, None, stats, trail
+    finally:
+        if responsecache is not None:  # 进程池结束时工作进程被直接终止，每个种子完成后写回访问时间
+            responsecache.flush()
+    realcommunity = _pool["truth"].union(seed)
+    scores = eval_scores(seed_list, realcommunity) if realcommunity else None
+    return seed, seed_list, scores, stats, trail
+
+def runseedspool(alllist,G,list_true,ns,iteration,K,SK,promptselect,processes=None,snapshotfile=None,tokenbudget=None,targetM=None):
+    """
+    使用进程池并行扩展多个种子节点的社区，并在每个种子完成后立即返回其社区和评价指标。
+    提供snapshotfile时每个工作进程通过load_snapshot内存映射同一个快照文件，图数据经由操作系统页缓存共享，不在进程间复制；
+    否则图通过fork继承给工作进程。
+    进程池总是使用fork启动方式（multiprocessing.get_context("fork")），不随平台默认的spawn或forkserver改变：
+    setbackend设置的后端、setrequestretry等各项设置、预算和追踪器都由工作进程直接继承，驱动脚本也不会在工作进程中重新执行，
+    因此不支持没有fork的平台（Windows）。
+    限流器必须以shared=True创建，以便所有进程共享同一个请求速率，否则抛出ValueError；
+    以shared=True设置的运行预算同样在各进程之间共享。已设置回复缓存时每个工作进程各自重新打开同一个缓存文件。
+
+    参数:
+    alllist (list): 种子节点列表。
+    G (dict 或 CSRGraph): 图结构，提供snapshotfile时可以为None。
+    list_true (list): 真实社区列表，用于计算评价指标，提供snapshotfile时使用快照中的真实社区。
+    ns (bool): 是否进行节点补充。
+    iteration (int): 迭代次数。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符。
+    processes (int): 工作进程数，默认为CPU核数。
+    snapshotfile (str): 可选，save_snapshot写出的快照文件。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    targetM (float): 可选，某次迭代的社区M值达到targetM后跳过该种子的其余迭代。
+
+    返回值:
+    generator: 按完成顺序产生(种子节点, 社区, eval_scores的结果, 节点选择统计, 各次迭代各阶段的社区)，种子不在任何真实社区中时评价指标为None。
+               某个工作进程中整个运行的预算用完时停止，不产生被中断的种子。
+    """
+    unshared = [key for key, limiter in ratelimiters.items() if not limiter.shared]
+    if unshared:
+        raise ValueError("rate limiters must be created with shared=True to be used by a process pool: " + str(unshared))
+    if snapshotfile is not None:
+        G, list_true = None, None
+    params = {"ns": ns, "iteration": iteration, "K": K, "SK": SK, "promptselect": promptselect,
+              "tokenbudget": tokenbudget, "targetM": targetM}
+    resources = {"limiters": dict(ratelimiters), "responsecache": None}
+    if responsecache is not None:
+        responsecache.flush()  # 工作进程复制本进程的内存，不能带走尚未写回的访问时间
+        resources["responsecache"] = {"path": responsecache.path, "maxentries": responsecache.maxentries,
+                                      "maxage": responsecache.maxage, "readonly": responsecache.readonly}
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, _poolinit, (snapshotfile, G, list_true, params, resources)) as pool:
+        for result in pool.imap_unordered(_poolexpand, alllist):
+            if result[3].get("stopped") == "budget":  # 运行预算用完，结束进程池，不再处理之后的种子
+                break
+            yield result
+
+def runconfig(ns, iteration, K, SK, promptselect, tokenbudget=None, **extra):
+    """
+    返回决定扩展结果的运行配置：gpt_communityexpansion的参数、模型以及setstructured、setretrylimit、sethybrid、
+    setbatch、setneighborhood和setbudget中每个种子预算的当前设置，用作RunJournal的配置。
+    整个运行的预算有意不计入：它只决定运行何时停止，被它中断的种子不写入日志，增大运行预算后重新运行即可继续，
+    不需要重做已完成的种子。
+
+    参数:
+    ns (bool): 是否进行节点补充。
+    iteration (int): 迭代次数。
+    K (int): 潜在节点的数量。
+    SK (bool): 是否包含补充知识的标志。
+    promptselect (int): 提示符选择符。
+    tokenbudget (int): 可选，每次请求输入文本的token预算。
+    extra: 其他影响结果的设置，如targetM、cover。
+
+    返回值:
+    dict: 可以JSON序列化的配置。
+    """
+    config = {"ns": ns, "iteration": iteration, "K": K, "SK": SK, "promptselect": promptselect,
+              "model": backend.model if backend is not None else MODEL,
+              "structured": STRUCTURED, "maxretries": MAXRETRIES, "timeout": DECISIONTIMEOUT,
+              "hybrid": HYBRIDGAP, "batch": BATCHSIZE, "tokenbudget": tokenbudget, "seedbudget": list(SEEDBUDGET),
+              "neighborhood": [NEIGHBORHOOD.fanout, NEIGHBORHOOD.total, NEIGHBORHOOD.seed] if NEIGHBORHOOD is not None else None}
+    config.update(extra)
+    return config
+
+
+class RunJournal:
+    """
+    一次运行的结果日志，每个种子完成后立即向JSONL文件追加一行并写入磁盘：种子、最终社区及其M值、
+    各次迭代各阶段的社区（cands）及其M值、评价指标和节点选择统计。文件只追加，中断时最多丢失正在写入的一行。
+    重新打开同一文件时读取已完成的种子，驱动脚本跳过这些种子即可从中断处继续运行，不再重复请求GPT。
+    提供config时每条记录带有配置的指纹，重新打开时只采用指纹相同的记录，配置改变后的种子会重新扩展并追加新记录。
+    stats中带有{"stopped": "budget"}（被整个运行的预算中断）的记录不算完成。
+
+    参数:
+    path (str): JSONL文件路径，不存在时创建。
+    G (dict 或 CSRGraph): 可选，图结构，提供时记录各社区的M值。
+    truth (GroundTruth): 可选，真实社区，提供时记录eval_scores的结果。
+    config (dict): 可选，运行配置，通常由runconfig得到。
+    """
+
+    def __init__(self, path, G=None, truth=None, config=None):
+        self.path = path
+        self.G = G
+        self.truth = truth
+        self.config = config
+        self.fingerprint = None
+        if config is not None:
+            self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        self.records = {}  # 种子节点 -> 记录，同一种子有多条记录时以最后一条为准
+        self.stale = 0  # 因配置不同而忽略的记录数
+        if os.path.exists(path):
+            with open(path, "rb+") as file:
+                data = file.read()
+                end = data.rfind(b"\n") + 1
+                if end < len(data):  # 去掉中断时未写完的最后一行，避免与之后追加的记录连在一起
+                    file.truncate(end)
+            for line in data[:end].decode("utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if self.fingerprint is not None and record.get("config") != self.fingerprint:
+                    self.stale = self.stale + 1
+                    continue
+                if (record.get("stats") or {}).get("stopped") == "budget":
+                    continue
+                self.records[record["seed"]] = record
+            if self.stale:
+                logger.info(path + "中有" + str(self.stale) + "条记录的运行配置不同，已忽略")
+        self.file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __contains__(self, seed):
+        return seed in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def communities(self):
+        """
+        返回值:
+        dict: 种子节点 -> 已记录的最终社区。
+        """
+        return {seed: record["community"] for seed, record in self.records.items()}
+
+    def pending(self, seeds):
+        """
+        返回值:
+        list: seeds中尚未完成的种子，保持原有顺序。
+        """
+        return [seed for seed in seeds if seed not in self.records]
+
+    def record(self, seed, community, cands=None, stats=None, scores=None, cover=None):
+        """
+        写入一个种子的结果。
+
+        参数:
+        seed (int): 种子节点。
+        community (list): 最终社区。
+        cands (list): 可选，各次迭代各阶段的社区，如gpt_communityexpansion的trail。
+        stats (dict): 可选，节点选择统计。
+        scores (tuple): 可选，eval_scores的结果，没有提供而设置了truth时自动计算。
+        cover (dict): 可选，覆盖模式中该种子在覆盖中的位置，见coverseeds。
+
+        返回值:
+        dict: 写入的记录。
+        """
+        if scores is None and self.truth is not None and community and self.truth.containing(seed):
+            scores = eval_scores(community, self.truth.union(seed))
+        record = {"seed": seed, "time": time.time(), "community": community,
+                  "M": computeM(community, self.G) if self.G is not None and community else None,
+                  "cands": [[{"community": cand, "M": computeM(cand, self.G) if self.G is not None else None}
+                             for cand in restart] for restart in (cands or [])],
+                  "scores": list(scores) if scores is not None else None, "stats": stats or {},
+                  "config": self.fingerprint, "cover": cover}
+        line = json.dumps(record, default=int) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if record["stats"].get("stopped") != "budget":  # 被运行预算中断的种子仍待完成
+                self.records[seed] = record
+        return record
+
+    def close(self):
+        self.file.close()
 
 
 #计算当前社区和真实社区的评价指标
@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import GPTLCD
+import llmserver
+
+
+##离线基准测试：在自带的数据集上测量图加载、潜在节点打分、子图提取、图编码和完整社区扩展的耗时，
+##GPT由进程内的确定性替身（llmserver.StandInBackend）代替，结果写入JSON文件，便于比较不同提交之间的性能。
+##用法: python benchmark.py --output bench.json --label $(git rev-parse --short HEAD)
+##缺少边文件的数据集（例如只有realdata.txt的amazon、dblp）会被跳过并在结果中注明原因。
+
+DATASETS = ["football", "dolphins", "polbooks", "amazon", "dblp"]
+SMALLDATASETS = ["football", "dolphins", "polbooks"]
+
+
+def datasetfiles(root, dataset):
+    """
+    返回值:
+    tuple: (图文件列表, 缺失的文件)。小数据集为[nodes.txt, G.txt]，大数据集为[<dataset>.txt]。
+    """
+    if dataset in SMALLDATASETS:
+        files = [os.path.join(root, dataset, "nodes.txt"), os.path.join(root, dataset, "G.txt")]
+    else:
+        files = [os.path.join(root, dataset, dataset + ".txt")]
+    missing = [file for file in files if not os.path.exists(file)]
+    return files, missing
+
+
+def measure(function, repeat):
+    """
+    执行function共repeat次，屏蔽其输出，记录每次的耗时。
+
+    返回值:
+    tuple: (耗时统计字典, 最后一次的返回值)。
+    """
+    times = []
+    result = None
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    return {"min": min(times), "mean": sum(times) / len(times), "repeat": repeat}, result
+
+
+def growcommunity(seed, G, size, K):
+    """
+    从种子出发每次加入Delta M最大的潜在节点，得到至多size个节点的社区，作为打分和编码测试的输入。
+    """
+    seed_list = [seed]
+    state = GPTLCD.CommunityState(G, seed_list)
+    while len(seed_list) < size:
+        candidate = GPTLCD.getevalcanidate(seed_list, G, K, state)
+        if len(candidate) == 0:
+            break
+        seed_list.append(candidate[0])
+    return seed_list
+
+
+def benchdataset(root, dataset, args):
+    """
+    对一个数据集执行全部测试。
+
+    返回值:
+    dict: 各项测试的耗时和规模；数据集文件缺失时为{"skipped": 原因}。
+    """
+    files, missing = datasetfiles(root, dataset)
+    if missing:
+        return {"skipped": "missing " + ", ".join(missing)}
+    results = {}
+    if dataset in SMALLDATASETS:
+        results["read"], G = measure(lambda: GPTLCD.read(*files), args.repeat)
+        results["read_csr"], C = measure(lambda: GPTLCD.read_csr(*files), args.repeat)
+    else:
+        results["read_bigdataset"], G = measure(lambda: GPTLCD.read_bigdataset(files[0]), args.repeat)
+        results["read_bigdataset_csr"], C = measure(lambda: GPTLCD.read_bigdataset_csr(files[0]), args.repeat)
+    seeds = random.Random(args.randomseed).sample(sorted(G.keys()), min(args.seeds, len(G)))
+    communities = [growcommunity(seed, G, args.size, args.K) for seed in seeds]
+
+    def scoring():
+        for seed_list in communities:
+            GPTLCD.StorageM(GPTLCD.getneighbors1(seed_list, G), seed_list, G)
+
+    def scoringstate():
+        for seed_list in communities:
+            state = GPTLCD.CommunityState(G, seed_list)
+            GPTLCD.StorageM(GPTLCD.getneighbors1(seed_list, G, state), seed_list, G, state)
+
+    def judgegraph(mode):
+        def run():
+            for seed_list in communities:
+                GPTLCD.getjudgegrpah(seed_list, G, mode, args.K)
+        return run
+
+    def encoder():
+        for seed_list in communities:
+            GPTLCD.Graphencoder(seed_list, G, 1, args.K, True)
+            GPTLCD.Graphencoder(seed_list, G, 2, args.K, True)
+
+    results["scoring"], _ = measure(scoring, args.repeat)
+    results["scoring_state"], _ = measure(scoringstate, args.repeat)
+    for mode in (1, 2, 3):  # 1为社区和潜在节点，2加入一阶邻居，3加入二阶邻居
+        results["getjudgegrpah_" + str(mode)], _ = measure(judgegraph(mode), args.repeat)
+    results["Graphencoder"], _ = measure(encoder, args.repeat)
+
+    def expansion():
+        stats = {}
+        found = [GPTLCD.gpt_communityexpansion(seed, G, True, args.iteration, args.K, True, 5, stats=stats) for seed in seeds]
+        return found, stats
+
+    standin = llmserver.StandInBackend(llmserver.StandIn(args.policy, seed=args.randomseed))
+    previous = GPTLCD.backend
+    GPTLCD.setbackend(standin)
+    try:
+        results["gpt_communityexpansion"], (found, stats) = measure(expansion, 1)
+    finally:
+        GPTLCD.setbackend(previous)  # 恢复原来的后端，之后的数据集和调用方不受影响
+    results["gpt_communityexpansion"].update({"calls": standin.calls, "stats": stats,
+                                              "sizes": [len(community) for community in found]})
+    return {"nodes": len(G), "edges": C.number_of_edges(), "seeds": seeds, "benchmarks": results}
+
+
+def summary(report):
+    """
+    以表格形式输出各数据集各项测试的最短耗时（毫秒）。
+    """
+    for dataset, result in report["datasets"].items():
+        if "skipped" in result:
+            print(dataset + ": 跳过（" + result["skipped"] + "）")
+            continue
+        print(dataset + ": 节点数 " + str(result["nodes"]) + " 边数 " + str(result["edges"]))
+        for name, timing in result["benchmarks"].items():
+            line = "    " + name.ljust(24) + str(round(timing["min"] * 1000, 3)).rjust(12) + " ms"
+            if "calls" in timing:
+                line += "  请求数 " + str(timing["calls"])
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark for GPT-LCD with a deterministic stand-in LLM.")
+    parser.add_argument("--datasets", nargs="+", default=DATASETS, choices=DATASETS)
+    parser.add_argument("--root", default=os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset")))
+    parser.add_argument("--seeds", type=int, default=5, help="seed nodes per dataset")
+    parser.add_argument("--size", type=int, default=10, help="community size used for scoring and encoding")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions of the micro benchmarks")
+    parser.add_argument("--iteration", type=int, default=2, help="restarts per seed in the end-to-end run")
+    parser.add_argument("--K", type=int, default=5)
+    parser.add_argument("--policy", choices=["top", "random"], default="top", help="stand-in answer policy")
+    parser.add_argument("--randomseed", type=int, default=0)
+    parser.add_argument("--label", default="", help="free-form label such as a commit hash")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--trace", help="also write per-stage JSONL traces to this file")
+    parser.add_argument("--profile", help="write cProfile statistics of the whole run to this file")
+    args = parser.parse_args()
+
+    report = {
+        "label": args.label,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "root")},
+        "datasets": {},
+    }
+    tracer = GPTLCD.settrace(args.trace) if args.trace else None
+    with GPTLCD.profiling(args.profile) if args.profile else contextlib.nullcontext():
+        for dataset in args.datasets:
+            report["datasets"][dataset] = benchdataset(args.root, dataset, args)
+    if tracer is not None:
+        report["stages"] = tracer.metrics()
+        GPTLCD.settrace(enabled=False)  # 关闭并清除追踪器
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    summary(report)
+    print("结果已写入" + args.output)
@@ -0,0 +1,204 @@
+import numpy as np
+import GPTLCD
+
+
+##批量评价：一次计算一次运行中全部种子的精确率、召回率、F1和Jaccard，以及覆盖层面的平均F1和ONMI。
+##社区以(行号, 节点)对的整数数组表示，交集大小由排序和连接得到，不对每个种子逐个做集合运算。
+##用法: report = evaluation.evaluate(communities, list_true); print(evaluation.table(report))
+
+
+def _pairs(communities):
+    # 把社区列表转换为去重后的(行号, 节点)数组
+    sizes = np.array([len(community) for community in communities], dtype=np.int64)
+    rows = np.repeat(np.arange(len(communities), dtype=np.int64), sizes)
+    nodes = np.fromiter((node for community in communities for node in community), dtype=np.int64, count=int(sizes.sum()))
+    pairs = np.unique(np.stack([rows, nodes], axis=1), axis=0) if len(nodes) else np.empty((0, 2), dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def overlap(predicted, truth):
+    """
+    计算两组社区中每一对有公共节点的社区的交集大小。
+
+    参数:
+    predicted (list): 社区列表A。
+    truth (list): 社区列表B。
+
+    返回值:
+    tuple: (A中社区编号数组, B中社区编号数组, 交集大小数组, A中各社区大小, B中各社区大小)，社区大小按去重后的节点计算。
+    """
+    prow, pnode = _pairs(predicted)
+    trow, tnode = _pairs(truth)
+    psize = np.bincount(prow, minlength=len(predicted))
+    tsize = np.bincount(trow, minlength=len(truth))
+    order = np.argsort(tnode, kind="stable")
+    tnode, trow = tnode[order], trow[order]
+    lo = np.searchsorted(tnode, pnode, "left")
+    counts = np.searchsorted(tnode, pnode, "right") - lo
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, psize, tsize
+    # 对每个节点做A中社区与B中社区的笛卡尔积
+    starts = np.repeat(lo, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    a = np.repeat(prow, counts)
+    b = trow[starts + offsets]
+    keys, inter = np.unique(a * len(truth) + b, return_counts=True)
+    return keys // len(truth), keys % len(truth), inter, psize, tsize
+
+
+def scoreseeds(predicted, truth):
+    """
+    批量计算每个种子的预测社区与其真实社区（包含种子的全部真实社区的并集）之间的评价指标。
+    与eval_scores不同，社区大小按去重后的节点计算。
+
+    参数:
+    predicted (dict): 种子节点 -> 预测社区。
+    truth (GroundTruth 或 list): 真实社区。
+
+    返回值:
+    dict: "seeds"、"precision"、"recall"、"f1"、"jaccard"，均为按种子排列的数组；不在任何真实社区中的种子不计入。
+    """
+    if not isinstance(truth, GPTLCD.GroundTruth):
+        truth = GPTLCD.GroundTruth(truth)
+    seeds = [seed for seed in predicted if truth.containing(seed) and predicted[seed]]
+    pred = [predicted[seed] for seed in seeds]
+    true = [truth.union(seed) for seed in seeds]
+    prow, pnode = _pairs(pred)
+    trow, tnode = _pairs(true)
+    psize = np.bincount(prow, minlength=len(seeds)).astype(float)
+    tsize = np.bincount(trow, minlength=len(seeds)).astype(float)
+    # 行号相同且节点相同的对即为交集
+    width = int(max(pnode.max(initial=0), tnode.max(initial=0))) + 1
+    common = np.intersect1d(prow * width + pnode, trow * width + tnode, assume_unique=True)
+    inter = np.bincount(common // width, minlength=len(seeds)).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(psize > 0, inter / psize, 0.0)
+        recall = np.where(tsize > 0, inter / tsize, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        jaccard = np.where(psize + tsize - inter > 0, inter / (psize + tsize - inter), 0.0)
+    return {"seeds": np.array(seeds), "precision": precision, "recall": recall, "f1": f1, "jaccard": jaccard}
+
+
+def averagef1(predicted, truth):
+    """
+    覆盖层面的平均F1：每个真实社区与最匹配的预测社区的F1的平均值，和每个预测社区与最匹配的真实社区的F1的平均值，两者再取平均。
+
+    参数:
+    predicted (list): 预测社区列表。
+    truth (list): 真实社区列表。
+
+    返回值:
+    float: 平均F1。
+    """
+    if len(predicted) == 0 or len(truth) == 0:
+        return 0.0
+    a, b, inter, psize, tsize = overlap(predicted, truth)
+    f1 = 2 * inter / (psize[a] + tsize[b])
+    bestp = np.zeros(len(predicted))
+    bestt = np.zeros(len(truth))
+    np.maximum.at(bestp, a, f1)
+    np.maximum.at(bestt, b, f1)
+    return float((bestp.mean() + bestt.mean()) / 2)
+
+
+def _h(p):
+    p = np.asarray(p, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p > 0, -p * np.log2(p), 0.0)
+
+
+def onmi(predicted, truth, n=None):
+    """
+    重叠社区的归一化互信息（McDaid等人的ONMI，按max(H(X), H(Y))归一化）。
+    每个社区看作一个二值随机变量，H(X_k|Y)取满足h(a)+h(d)>=h(b)+h(c)的Y_l中条件熵的最小值，没有满足条件的Y_l时为H(X_k)。
+    没有公共节点的社区对（d=0）也可能满足条件，其条件熵只取决于两个社区的大小，因此按A中社区和B中不同的社区大小成批计算，
+    有交集的社区对则逐对计算。
+
+    参数:
+    predicted (list): 预测社区列表。
+    truth (list): 真实社区列表。
+    n (int): 节点总数，默认为两组社区中出现的节点数。
+
+    返回值:
+    float: 0到1之间的ONMI。
+    """
+    if len(predicted) == 0 or len(truth) == 0:
+        return 0.0
+    a, b, inter, psize, tsize = overlap(predicted, truth)
+    if n is None:
+        n = len(np.union1d(_pairs(predicted)[1], _pairs(truth)[1]))
+    n = float(n)
+    hx = _h(psize / n) + _h(1 - psize / n)
+    hy = _h(tsize / n) + _h(1 - tsize / n)
+
+    def entropy(inter, sizex, sizey):
+        # 返回(是否满足条件, H(X_k|Y_l)+H(Y_l))
+        d = inter / n
+        c = (sizex - inter) / n
+        b_ = (sizey - inter) / n
+        a_ = 1 - d - c - b_
+        valid = _h(a_) + _h(d) >= _h(b_) + _h(c)
+        return valid, _h(a_) + _h(b_) + _h(c) + _h(d)
+
+    def conditional(x, y, sizex, sizey, hx, hy):
+        # H(X_k|Y)，x、y为有交集的社区对
+        valid, joint = entropy(inter, sizex[x], sizey[y])
+        result = hx.copy()
+        np.minimum.at(result, x[valid], (joint - hy[y])[valid])
+        # 没有交集的社区对：按Y的社区大小分组，某个大小的Y_l不全与X_k有交集时该大小可用
+        sizes, group, count = np.unique(sizey, return_inverse=True, return_counts=True)
+        xsizes, xgroup = np.unique(sizex, return_inverse=True)
+        shared = np.zeros((len(sizex), len(sizes)), dtype=np.int64)
+        np.add.at(shared, (x, group[y]), 1)
+        valid, joint = entropy(0.0, xsizes[:, None], sizes[None, :])
+        value = np.where(valid, joint - (_h(sizes / n) + _h(1 - sizes / n)), np.inf)[xgroup]
+        value[shared >= count] = np.inf
+        return np.minimum(result, value.min(axis=1, initial=np.inf))
+
+    hxy = conditional(a, b, psize, tsize, hx, hy).sum()
+    hyx = conditional(b, a, tsize, psize, hy, hx).sum()
+    denominator = 2 * max(hx.sum(), hy.sum())
+    if denominator == 0:
+        return 1.0
+    return float((hx.sum() - hxy + hy.sum() - hyx) / denominator)
+
+
+def evaluate(predicted, truth, n=None):
+    """
+    评价一次运行的全部预测社区。
+
+    参数:
+    predicted (dict): 种子节点 -> 预测社区。
+    truth (GroundTruth 或 list): 真实社区。
+    n (int): 可选，图的节点数，用于ONMI。
+
+    返回值:
+    dict: 各种子指标的平均值（precision、recall、f1、jaccard），覆盖层面的avgf1和onmi，以及逐种子的结果perseed。
+          覆盖层面的指标只与包含至少一个种子的真实社区比较，预测社区中相同的社区只计一次。
+    """
+    if not isinstance(truth, GPTLCD.GroundTruth):
+        truth = GPTLCD.GroundTruth(truth)
+    perseed = scoreseeds(predicted, truth)
+    ids = sorted({i for seed in perseed["seeds"].tolist() for i in truth.containing(seed)})
+    relevant = [truth[i] for i in ids]
+    cover = list({frozenset(community) for community in predicted.values() if community})
+    report = {"seeds": len(perseed["seeds"]), "unmatched": len(predicted) - len(perseed["seeds"])}
+    for key in ("precision", "recall", "f1", "jaccard"):
+        report[key] = float(perseed[key].mean()) if len(perseed[key]) else 0.0
+    report["avgf1"] = averagef1(cover, relevant)
+    report["onmi"] = onmi(cover, relevant, n)
+    report["perseed"] = perseed
+    return report
+
+
+def table(report):
+    """
+    返回值:
+    str: evaluate结果的汇总表。
+    """
+    rows = [("seeds", report["seeds"]), ("unmatched seeds", report["unmatched"])]
+    rows += [(key, round(report[key], 4)) for key in ("precision", "recall", "f1", "jaccard", "avgf1", "onmi")]
+    width = max(len(name) for name, value in rows)
+    return "\n".join(name.ljust(width) + "  " + str(value) for name, value in rows)
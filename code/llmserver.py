@@ -0,0 +1,249 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import GPTLCD
+
+
+##本地的GPT替身：实现OpenAI兼容的chat-completions接口，按设定的策略回答节点选择和节点补充问题，
+##用于在没有网络的情况下对整个社区扩展流程做压力测试和性能分析。
+##用法: python llmserver.py --port 8000 --policy top --latency lognormal --latency-mean 0.5 --error-rate 0.05
+##然后在驱动脚本中: GPTLCD.setbackend(GPTLCD.HTTPBackend("http://127.0.0.1:8000/v1"))
+
+
+def _nodelist(pattern, text):
+    match = re.search(pattern, text)
+    if match is None:
+        return None
+    return [int(x) for x in re.findall(r'-?\d+', match.group(1))]
+
+
+def parsequestion(text):
+    """
+    从llms构建的提示中解析问题类型和候选节点。提示末尾可能带有STRUCTUREDINSTRUCTION或STRUCTUREDBATCHINSTRUCTION。
+
+    参数:
+    text (str): 用户消息内容。
+
+    返回值:
+    tuple: (类型, 候选节点列表)。类型为"parse"（从上一段回复中提取节点）、"select"（节点选择）或"supplement"（节点补充）。
+    """
+    if GPTLCD.PARSEINSTRUCTION in text:
+        return "parse", []
+    patch = _nodelist(r'Please analyze whether these nodes\[([^\]]*)\]', text)
+    if patch is not None:
+        return "supplement", patch
+    candidate = _nodelist(r'The outside nodes contain:\[([^\]]*)\]', text)
+    if candidate is None:
+        candidate = _nodelist(r'from the outside nodes \[([^\]]*)\]', text)
+    if candidate is None:  # 没有补充知识和NSG提示时，候选节点为图中不属于社区的节点
+        nodes = _nodelist(r'G describes a graph among ([^.]*)\.', text) or []
+        community = set(_nodelist(r'current community\[([^\]]*)\]', text) or [])
+        candidate = [node for node in nodes if node not in community]
+    return "select", candidate
+
+
+class StandIn:
+    """
+    替身模型的回答策略、延迟分布和错误率。
+
+    参数:
+    policy (str): 回答策略。"top"选择排在第一位（Delta M最大）的候选节点、节点补充时回答null；
+                  "random"随机选择候选节点、节点补充时以一半概率回答null；"malformed"输出无法解析或不在候选中的文本。
+    latency (str): 延迟分布，"fixed"、"uniform"（0到两倍均值）、"exponential"或"lognormal"。
+    latencymean (float): 平均延迟秒数。
+    errorrate (float): 返回错误的概率。
+    errorstatus (int): 错误时的HTTP状态码，429会被getgpt当作限流处理，5xx当作临时错误，两者都会有限次地重试。
+    seed (int): 随机数种子。
+    """
+
+    def __init__(self, policy="top", latency="fixed", latencymean=0.0, errorrate=0.0, errorstatus=429, seed=0):
+        self.policy = policy
+        self.latency = latency
+        self.latencymean = latencymean
+        self.errorrate = errorrate
+        self.errorstatus = errorstatus
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """
+        返回值:
+        float: 按延迟分布抽取的本次延迟秒数。
+        """
+        with self._lock:
+            if self.latencymean <= 0 or self.latency == "fixed":
+                return max(self.latencymean, 0)
+            if self.latency == "uniform":
+                return self.random.uniform(0, 2 * self.latencymean)
+            if self.latency == "exponential":
+                return self.random.expovariate(1 / self.latencymean)
+            sigma = 0.5  # 对数正态分布，均值为latencymean
+            return self.random.lognormvariate(math.log(self.latencymean) - sigma * sigma / 2, sigma)
+
+    def failed(self):
+        """
+        返回值:
+        bool: 本次请求是否返回错误。
+        """
+        with self._lock:
+            return self.random.random() < self.errorrate
+
+    def answer(self, messages):
+        """
+        按策略回答一次对话。
+
+        参数:
+        messages (list): 对话消息列表。
+
+        返回值:
+        str: 回复文本。
+        """
+        text = messages[-1]["content"]
+        kind, candidate = parsequestion(text)
+        reply = self._answer(text, kind, candidate)
+        structured = GPTLCD.STRUCTUREDINSTRUCTION in text or GPTLCD.STRUCTUREDBATCHINSTRUCTION in text
+        if structured and kind != "parse":
+            with self._lock:
+                if self.policy == "malformed" and self.random.random() < 0.5:
+                    return reply
+            if GPTLCD.STRUCTUREDBATCHINSTRUCTION in text:
+                reply += "\n" + json.dumps({"nodes": GPTLCD.extract_numbers_from_string(reply)})
+            else:
+                reply += "\n" + json.dumps({"node": GPTLCD.extract_number_from_string(reply)})
+        return reply
+
+    def _answer(self, text, kind, candidate):
+        with self._lock:
+            if kind == "parse":
+                reply = text[:text.index(GPTLCD.PARSEINSTRUCTION)]
+                if self.policy == "malformed" and self.random.random() < 0.5:
+                    return "I am not sure."
+                numbers = GPTLCD.extract_numbers_from_string(reply)
+                return ", ".join(str(number) for number in numbers) if numbers else "null"
+            if self.policy == "malformed":
+                return self.random.choice(["I cannot decide which node to add.",
+                                           "Node " + str(self.random.randint(10 ** 6, 10 ** 7)) + " looks good."])
+            if kind == "supplement":
+                if self.policy == "top" or not candidate or self.random.random() < 0.5:
+                    return "No node should be added, null."
+                return "Node " + str(self.random.choice(candidate)) + " should be added."
+            if not candidate:
+                return "null"
+            batch = re.search(r'please select up to (\d+) nodes', text)
+            if batch is not None:
+                size = min(int(batch.group(1)), len(candidate))
+                nodes = candidate[:size] if self.policy == "top" else self.random.sample(candidate, size)
+                return "Nodes " + ", ".join(str(node) for node in nodes) + " are connected to several nodes within the community, ranked from most to least likely."
+            node = candidate[0] if self.policy == "top" else self.random.choice(candidate)
+            return "Node " + str(node) + " is connected to several nodes within the community, so I select node " + str(node) + "."
+
+
+class StandInBackend(GPTLCD.LLMBackend):
+    """
+    在进程内直接调用StandIn的后端，不经过HTTP，适合确定性的离线测试和基准测试。
+
+    参数:
+    standin (StandIn): 替身模型，默认为无延迟的"top"策略。
+
+    属性:
+    calls (int): 收到的请求数，包括模拟出错的请求。
+    """
+
+    def __init__(self, standin=None, model=GPTLCD.MODEL):
+        self.standin = standin or StandIn()
+        self.model = model
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def chat(self, messages):
+        with self._lock:
+            self.calls = self.calls + 1
+        time.sleep(self.standin.delay())
+        if self.standin.failed():
+            if self.standin.errorstatus == 429:
+                raise GPTLCD.LLMRateLimitError("stand-in error")
+            raise GPTLCD.LLMTransientError("stand-in error " + str(self.standin.errorstatus))
+        reply = self.standin.answer(messages)
+        return reply, usage(messages, reply)
+
+
+def usage(messages, reply):
+    """
+    按每4个字符约1个token估算用量，格式与OpenAI的usage字段相同。
+    """
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4 + 1
+    completion_tokens = len(reply) // 4 + 1
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+class Handler(BaseHTTPRequestHandler):
+    standin = None
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.standin.delay())
+        if self.standin.failed():
+            kind = "rate_limit_error" if self.standin.errorstatus == 429 else "server_error"
+            self._send(self.standin.errorstatus, {"error": {"message": "stand-in error", "type": kind}})
+            return
+        reply = self.standin.answer(body["messages"])
+        self._send(200, {
+            "id": "standin-" + str(time.time_ns()),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", GPTLCD.MODEL),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage(body["messages"], reply),
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(standin, host="127.0.0.1", port=8000):
+    """
+    启动替身服务器。
+
+    参数:
+    standin (StandIn): 替身模型。
+    host (str): 监听地址。
+    port (int): 监听端口，0表示任选空闲端口。
+
+    返回值:
+    ThreadingHTTPServer: 服务器对象，调用serve_forever()开始服务。
+    """
+    handler = type("StandInHandler", (Handler,), {"standin": standin})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for load-testing GPT-LCD.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--policy", choices=["top", "random", "malformed"], default="top")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--latency-mean", type=float, default=0.0, help="mean latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = serve(StandIn(args.policy, args.latency, args.latency_mean, args.error_rate, args.error_status, args.seed),
+                   args.host, args.port)
+    print("stand-in listening on http://" + args.host + ":" + str(server.server_address[1]) + "/v1")
+    server.serve_forever()
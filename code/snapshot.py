@@ -0,0 +1,26 @@
+import argparse
+import time
+import GPTLCD
+
+
+##将文本边文件（及真实社区文件）转换为二进制快照，之后由GPTLCD.load_snapshot内存映射加载
+##用法: python snapshot.py ../dataset/amazon/amazon.txt ../dataset/amazon/amazon.snap --truth ../dataset/amazon/realdata.txt
+##使用--relabel时真实社区也转换为稠密编号保存，驱动脚本中的种子节点需用G.fromlabels转换
+parser = argparse.ArgumentParser(description="Convert an edge list into a memory-mappable graph snapshot.")
+parser.add_argument("edges", help="edge list file, one 'node1 node2' pair per line")
+parser.add_argument("output", help="snapshot file to write")
+parser.add_argument("--truth", help="ground-truth communities file: one community per line, or a groundTruth.csv of the small datasets")
+parser.add_argument("--nodes", help="node list file (small datasets such as football)")
+parser.add_argument("--relabel", action="store_true", help="relabel nodes to 0..n-1")
+args = parser.parse_args()
+
+start = time.time()
+if args.nodes:
+    G = GPTLCD.read_csr(args.nodes, args.edges, args.relabel)
+else:
+    G = GPTLCD.read_bigdataset_csr(args.edges, args.relabel)
+list_true = None
+if args.truth:
+    list_true = GPTLCD.read_csv(args.truth) if args.truth.endswith(".csv") else GPTLCD.read_truthbigdataset(args.truth)
+GPTLCD.save_snapshot(args.output, G, list_true)
+print("节点数:" + str(len(G)) + " 边数:" + str(G.number_of_edges()) + " 耗时:" + str(round(time.time() - start, 2)) + "s")
@@ -0,0 +1,65 @@
+import math
+import random
+import evaluation
+
+
+##evaluation.onmi与直接按McDaid等人的定义逐对计算的ONMI对比。
+##用法: python -m pytest test_evaluation.py
+
+
+def h(p):
+    return -p * math.log2(p) if p > 0 else 0.0
+
+
+def referenceonmi(predicted, truth, n):
+    """
+    直接按定义计算的ONMI：对每个X_k遍历全部Y_l，不区分是否有公共节点。
+    """
+    def entropy(community):
+        return h(len(community) / n) + h(1 - len(community) / n)
+
+    def conditional(X, Y):
+        total = 0.0
+        for x in X:
+            best = entropy(x)
+            for y in Y:
+                d = len(x & y) / n
+                c = (len(x) - len(x & y)) / n
+                b = (len(y) - len(x & y)) / n
+                a = 1 - b - c - d
+                if h(a) + h(d) >= h(b) + h(c):
+                    best = min(best, h(a) + h(b) + h(c) + h(d) - entropy(y))
+            total += best
+        return total
+
+    hx = sum(entropy(x) for x in predicted)
+    hy = sum(entropy(y) for y in truth)
+    denominator = 2 * max(hx, hy)
+    if denominator == 0:
+        return 1.0
+    return (hx - conditional(predicted, truth) + hy - conditional(truth, predicted)) / denominator
+
+
+def randomcover(rng, n, count, largest):
+    return [set(rng.sample(range(n), rng.randint(1, largest))) for i in range(count)]
+
+
+def test_disjoint_pair():
+    # 没有公共节点的社区对也满足h(a)+h(d)>=h(b)+h(c)
+    predicted, truth = [{0}], [set(range(1, 30))]
+    assert math.isclose(evaluation.onmi(predicted, truth, 39), referenceonmi(predicted, truth, 39), abs_tol=1e-12)
+    assert evaluation.onmi(predicted, truth, 39) > 0
+
+
+def test_matches_reference():
+    rng = random.Random(0)
+    for trial in range(200):
+        n = rng.randint(5, 60)
+        predicted = randomcover(rng, n, rng.randint(1, 6), n // 2)
+        truth = randomcover(rng, n, rng.randint(1, 6), n - 1)
+        assert math.isclose(evaluation.onmi(predicted, truth, n), referenceonmi(predicted, truth, n), abs_tol=1e-9), (n, predicted, truth)
+
+
+def test_identical_covers():
+    cover = [{0, 1, 2}, {3, 4, 5, 6}, {6, 7}]
+    assert math.isclose(evaluation.onmi(cover, cover, 10), 1.0)
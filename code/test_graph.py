@@ -0,0 +1,187 @@
+import random
+import pytest
+import GPTLCD
+
+
+##CSRGraph及其读取函数与原来的字典形式的图（read、read_bigdataset）对比。
+##用法: python -m pytest test_graph.py
+
+
+def randomgraph(rng, labels, m):
+    """
+    返回值:
+    dict: 以labels为节点的随机无向图，可能包含重复边、自环和孤立节点。
+    """
+    G = {node: [] for node in labels}
+    for i in range(m):
+        node1, node2 = rng.choice(labels), rng.choice(labels)
+        G[node1].append(node2)
+        if node1 != node2:
+            G[node2].append(node1)
+    return G
+
+
+def randomlabels(rng, n):
+    # 稀疏的原始编号，用于检查重新编号
+    return sorted(rng.sample(range(10 ** 9), n))
+
+
+def writegraph(tmp_path, G):
+    """
+    按read要求的格式写出节点文件和边文件，每条边写一次。
+
+    返回值:
+    tuple: (节点文件路径, 边文件路径)
+    """
+    file1, file2 = tmp_path / "nodes.txt", tmp_path / "G.txt"
+    file1.write_text("".join(str(node) + "\n" for node in G))
+    edges = []
+    for node, nodelist in G.items():
+        for nodee in nodelist:
+            if node < nodee or (node == nodee and [node, nodee] not in edges):
+                edges.append([node, nodee])
+    file2.write_text("".join(str(node1) + " " + str(node2) + "\n" for node1, node2 in edges))
+    return str(file1), str(file2)
+
+
+def assertsame(C, G):
+    # CSR图与字典图表示同一个无向简单图：节点相同，邻居为去重、去自环后的升序列表
+    assert len(C) == len(G)
+    assert set(C.tolabels(C)) == set(G)
+    edges = 0
+    for node, dense in zip(C.tolabels(C), C):
+        expected = sorted(set(G[node]) - {node})
+        assert C.tolabels(C[dense]) == expected
+        assert C.degree(dense) == len(expected)
+        edges = edges + len(expected)
+    assert C.number_of_edges() * 2 == edges
+
+
+def test_from_dict_matches():
+    rng = random.Random(0)
+    for trial in range(30):
+        n = rng.randint(1, 50)
+        G = randomgraph(rng, list(range(n)), rng.randint(0, 150))
+        C = GPTLCD.CSRGraph.from_dict(G)
+        assertsame(C, G)
+        assert C.todict() == {node: sorted(set(G[node]) - {node}) for node in G}
+        for i in range(20):
+            node1, node2 = rng.randrange(n), rng.randrange(n)
+            assert C.has_edge(node1, node2) == (node1 != node2 and node2 in G[node1])
+        assert n not in C and -1 not in C
+
+
+def test_relabel_matches():
+    rng = random.Random(1)
+    for trial in range(30):
+        labels = randomlabels(rng, rng.randint(1, 50))
+        G = randomgraph(rng, labels, rng.randint(0, 150))
+        C = GPTLCD.CSRGraph.from_dict(G, relabel=True)
+        assert list(C) == list(range(len(labels)))
+        assertsame(C, G)
+        assert C.todict() == {node: sorted(set(G[node]) - {node}) for node in G}
+        assert C.fromlabels(labels) == list(range(len(labels)))
+        assert C.tolabels(C.fromlabels(labels)) == labels
+
+
+def test_from_array_matches_from_edges():
+    rng = random.Random(2)
+    for trial in range(30):
+        labels = randomlabels(rng, rng.randint(1, 50)) if trial % 2 else list(range(rng.randint(1, 50)))
+        edges = [(rng.choice(labels), rng.choice(labels)) for i in range(rng.randint(0, 150))]
+        for relabel in ((True,) if trial % 2 else (False, True)):  # 稀疏编号不重新编号时偏移数组过大
+            expected = GPTLCD.CSRGraph.from_edges(edges, labels, relabel)
+            actual = GPTLCD.CSRGraph.from_array(edges, labels, relabel)
+            assert list(actual.offsets) == list(expected.offsets)
+            assert list(actual.neighbors) == list(expected.neighbors)
+            assert bytes(actual.present) == bytes(expected.present)
+            assert actual.tolabels(actual) == expected.tolabels(expected)
+
+
+def test_read_csr_matches_read(tmp_path):
+    rng = random.Random(3)
+    for trial in range(10):
+        labels = randomlabels(rng, rng.randint(1, 50)) if trial % 2 else list(range(rng.randint(1, 50)))
+        file1, file2 = writegraph(tmp_path, randomgraph(rng, labels, rng.randint(0, 150)))
+        G = GPTLCD.read(file1, file2)
+        assertsame(GPTLCD.read_csr(file1, file2, relabel=True), G)
+        if labels[-1] < 1000:
+            assertsame(GPTLCD.read_csr(file1, file2), G)
+
+
+def test_snapshot_round_trip(tmp_path):
+    rng = random.Random(4)
+    for trial in range(10):
+        n = rng.randint(1, 50)
+        G = randomgraph(rng, list(range(n)), rng.randint(0, 150))
+        list_true = [rng.sample(range(n), rng.randint(1, n)) for i in range(rng.randint(0, 4))]
+        filename = str(tmp_path / "graph.snap")
+        GPTLCD.save_snapshot(filename, G, list_true)
+        C, truth = GPTLCD.load_snapshot(filename)
+        assert C.labels is None
+        assertsame(C, G)
+        assert truth == list_true
+        assert isinstance(truth, GPTLCD.GroundTruth)
+
+
+def test_snapshot_relabelled_truth(tmp_path):
+    rng = random.Random(5)
+    for trial in range(10):
+        labels = randomlabels(rng, rng.randint(1, 50))
+        G = randomgraph(rng, labels, rng.randint(0, 150))
+        list_true = [rng.sample(labels, rng.randint(1, len(labels))) for i in range(rng.randint(1, 4))]
+        list_true[0].append(10 ** 9)  # 不在图中的节点被去掉
+        filename = str(tmp_path / "graph.snap")
+        GPTLCD.save_snapshot(filename, GPTLCD.CSRGraph.from_dict(G, relabel=True), list_true)
+        C, truth = GPTLCD.load_snapshot(filename)
+        assertsame(C, G)
+        assert [C.tolabels(community) for community in truth] == [community[:-1] for community in list_true[:1]] + list_true[1:]
+        seed = truth[-1][0]
+        assert set(C.tolabels(truth.union(seed))) == {node for community in list_true if C.tolabels([seed])[0] in community for node in community} - {10 ** 9}
+
+
+def writeedges(rng, filename, edges):
+    """
+    用随机的分隔符、行尾、注释和权重列写出边文件，模拟SNAP等数据集的格式。
+    """
+    weights = rng.random() < 0.5
+    with open(filename, 'w', newline='') as file:
+        file.write("# Directed graph: test\r\n% FromNodeId\tToNodeId\n\n")
+        for node1, node2 in edges:
+            separator = rng.choice([" ", "\t", ",", ", ", "  "])
+            line = str(node1) + separator + str(node2)
+            if weights:
+                line = line + separator + str(rng.randint(1, 9)) + "." + str(rng.randint(0, 99))
+            if rng.random() < 0.1:
+                line = line + " # comment"
+            file.write(line + rng.choice(["\n", "\r\n"]))
+            if rng.random() < 0.05:
+                file.write("\n")
+
+
+def test_read_edges_formats(tmp_path):
+    rng = random.Random(6)
+    filename = str(tmp_path / "edges.txt")
+    for trial in range(20):
+        labels = randomlabels(rng, rng.randint(1, 50))
+        edges = [(rng.choice(labels), rng.choice(labels)) for i in range(rng.randint(1, 100))]
+        writeedges(rng, filename, edges)
+        for chunksize in (1, 7, 64, GPTLCD.EDGECHUNK):  # 行跨越块边界
+            assert GPTLCD.read_edges(filename, chunksize).tolist() == [list(edge) for edge in edges]
+        G = {}
+        for node1, node2 in edges:
+            G.setdefault(node1, []).append(node2)
+            G.setdefault(node2, []).append(node1)
+        assert GPTLCD.read_bigdataset(filename) == {node: sorted(set(G[node]) - {node}) for node in G}
+        assertsame(GPTLCD.read_bigdataset_csr(filename, relabel=True), G)
+
+
+def test_read_edges_ragged(tmp_path):
+    filename = tmp_path / "edges.txt"
+    filename.write_text("# header\n1 2\n3 4\n\n5 6 7\n8 9\n")
+    for chunksize in (1, 5, GPTLCD.EDGECHUNK):
+        with pytest.raises(ValueError, match="line 5 has 3 columns, expected 2"):
+            GPTLCD.read_edges(str(filename), chunksize)
+    filename.write_text("1 2\n3 x\n")
+    with pytest.raises(ValueError, match="could not parse"):
+        GPTLCD.read_edges(str(filename))
@@ -0,0 +1,57 @@
+import GPTLCD
+
+
+##parsestructured、parsestructurednodes对各种结构化回复的解析结果，以及批量选择时的提示。
+##用法: python -m pytest test_parse.py
+
+
+def test_last_json_object():
+    assert GPTLCD.parsestructured('Node 3 has the most links.\n{"node": 12}') == (True, 12)
+    assert GPTLCD.parsestructured('{"node": 3}\nOn second thought:\n{"node": 8}') == (True, 8)
+    assert GPTLCD.parsestructured('{"node": 3} {"confidence": 0.9}') == (True, 3)  # 没有node键的对象被跳过
+    assert GPTLCD.parsestructured('Node 3.\n```json\n{"node": "14"}\n```') == (True, 14)
+
+
+def test_no_node():
+    for reply in ('No node fits.\n{"node": null}', '{"node": "null"}', '{"node": ""}', 'null', '"NULL".'):
+        assert GPTLCD.parsestructured(reply) == (True, None), reply
+
+
+def test_bare_number():
+    assert GPTLCD.parsestructured("42") == (True, 42)
+    assert GPTLCD.parsestructured(" `7`. ") == (True, 7)
+
+
+def test_unparsed():
+    # 解析失败时由调用方再请求GPT提取节点
+    for reply in ("I would pick node 5.", '{node: 5}', '{"node": true}', '{"node": 2.5}', '{"node": "node 5"}', ""):
+        assert GPTLCD.parsestructured(reply) == (False, None), reply
+
+
+def test_nodes_list():
+    assert GPTLCD.parsestructurednodes('Ranking:\n{"nodes": [5, 12, 3]}') == (True, [5, 12, 3])
+    assert GPTLCD.parsestructurednodes('{"nodes": [1]}\n{"nodes": ["9", 9, true, 2.5, 4]}') == (True, [9, 4])
+    assert GPTLCD.parsestructurednodes('{"nodes": []}') == (True, [])
+
+
+def test_nodes_fallbacks():
+    # 也接受单节点格式和只有节点编号的回复
+    assert GPTLCD.parsestructurednodes('{"node": 6}') == (True, [6])
+    assert GPTLCD.parsestructurednodes('{"node": null}') == (True, [])
+    assert GPTLCD.parsestructurednodes("[8, 2, 8]") == (True, [8, 2])
+    assert GPTLCD.parsestructurednodes("11") == (True, [11])
+    assert GPTLCD.parsestructurednodes("Nodes 8 and 2 look best.") == (False, [])
+    assert GPTLCD.parsestructurednodes('{"nodes": "8, 2"}') == (False, [])
+
+
+def test_batch_prompt():
+    # 批量选择时提示与指令都要求给出排名的多个节点
+    previous = GPTLCD.BATCHSIZE
+    try:
+        GPTLCD.setbatch(1)
+        assert "the node that best meets" in GPTLCD.prompt(1, 5, [1, 2])
+        GPTLCD.setbatch(3)
+        assert "up to 3 nodes that best meet these two guides, ranked" in GPTLCD.prompt(1, 5, [1, 2])
+        assert "select up to 3 nodes" in GPTLCD.instrucionstr([0], {0: [1, 2]}, 1, 2)
+    finally:
+        GPTLCD.setbatch(previous)
@@ -0,0 +1,68 @@
+import math
+import random
+import GPTLCD
+
+
+##CommunityState与不使用状态的computeM、getneighbors1、StorageM、StorageM2对比。
+##用法: python -m pytest test_state.py
+
+
+def randomgraph(rng, n, m):
+    """
+    返回值:
+    dict: 字典形式的随机无向图，可能包含重复边和自环。
+    """
+    G = {node: [] for node in range(n)}
+    for i in range(m):
+        node1, node2 = rng.randrange(n), rng.randrange(n)
+        G[node1].append(node2)
+        if node1 != node2:
+            G[node2].append(node1)
+    return G
+
+
+def close(x, y):
+    return math.isclose(x, y, rel_tol=1e-12, abs_tol=1e-12)
+
+
+def test_grow_matches_dict_functions():
+    rng = random.Random(0)
+    for trial in range(30):
+        G = randomgraph(rng, rng.randint(5, 60), rng.randint(5, 200))
+        seed_list = [rng.choice(list(G))]
+        state = GPTLCD.CommunityState(G, seed_list)
+        for step in range(15):
+            assert close(state.computeM(), GPTLCD.computeM(seed_list, G))
+            neighbors = GPTLCD.getneighbors1(seed_list, G)
+            assert set(state.getneighbors1()) == set(neighbors)
+            for node in neighbors + seed_list[:2]:  # 社区中的节点也可以再次加入
+                assert close(state.computeM_add(node), GPTLCD.computeM(seed_list + [node], G))
+            if not neighbors:
+                break
+            seed_list.append(rng.choice(neighbors + seed_list))
+            state.sync(seed_list)
+
+
+def test_storageM_matches():
+    rng = random.Random(1)
+    for trial in range(30):
+        G = randomgraph(rng, rng.randint(5, 60), rng.randint(5, 200))
+        seed_list = rng.sample(list(G), rng.randint(1, 5))
+        state = GPTLCD.CommunityState(G)
+        neighbors = GPTLCD.getneighbors1(seed_list, G)
+        for storage in (GPTLCD.StorageM, GPTLCD.StorageM2):
+            expected = storage(neighbors, seed_list, G)
+            actual = storage(neighbors, seed_list, G, state)
+            assert expected.keys() == actual.keys()
+            assert all(close(expected[node], actual[node]) for node in expected)
+
+
+def test_sync_rebuilds_on_other_community():
+    rng = random.Random(2)
+    G = randomgraph(rng, 40, 120)
+    state = GPTLCD.CommunityState(G, [0, 1, 2])
+    for trial in range(20):
+        seed_list = rng.sample(list(G), rng.randint(1, 8))
+        state.sync(seed_list)
+        assert close(state.computeM(), GPTLCD.computeM(seed_list, G))
+        assert set(state.getneighbors1()) == set(GPTLCD.getneighbors1(seed_list, G))